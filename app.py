@@ -9,13 +9,15 @@ from flask_cors import CORS
 from search_engine import SearchEngine
 from product import Product
 from recommendation_engine import RecommendationEngine
+from sorting import parse_sort_spec
 import json
+import math
 
 app = Flask(__name__)
 CORS(app)
 
-# Initialize search engine
-search_engine = SearchEngine(hash_type='chaining')
+# Initialize search engine (product IDs are integers, so the Fibonacci-hashed table applies)
+search_engine = SearchEngine(hash_type='fibonacci')
 
 # Initialize recommendation engine
 recommendation_engine = RecommendationEngine(search_engine)
@@ -157,9 +159,14 @@ sample_products = [
             "https://images.unsplash.com/photo-1599669454699-248893623440?w=400&h=400&fit=crop&q=80", "Audio"),
 ]
 
+# Time hash table resizes for /api/stats/index
+search_engine.enable_index_stats()
+
 # Load sample products
-for product in sample_products:
-    search_engine.add_product(product)
+search_engine.add_products(sample_products)
+
+# Materialize recommendation neighbors (kept up to date on catalog changes)
+recommendation_engine.build_neighbors()
 
 
 @app.route('/')
@@ -170,16 +177,49 @@ def index():
 
 @app.route('/api/products', methods=['GET'])
 def get_products():
-    """Get all products with optional sorting."""
+    """Get all products with optional (multi-key) sorting."""
     sort_by = request.args.get('sort_by', 'id')
     order = request.args.get('order', 'asc')
-    algorithm = request.args.get('algorithm', 'merge')
+    algorithm = request.args.get('algorithm')  # None serves the cached ordering
+    limit = request.args.get('limit', type=int)
+    
+    page_size = request.args.get('page_size', type=int)
+    cursor = request.args.get('cursor')
     
-    products = search_engine.sort_products(sort_by=sort_by, order=order, algorithm=algorithm)
+    # sort_by may list several keys, e.g. 'rating:desc,price:asc'
+    sort_spec = parse_sort_spec(sort_by, order)
+    
+    # Keyset pagination when a page size or cursor is given
+    if page_size is not None or cursor:
+        try:
+            products, next_cursor = search_engine.page_products(
+                sort_by=sort_spec, order=order, page_size=20 if page_size is None else page_size, cursor=cursor)
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 400
+        
+        return jsonify({
+            'success': True,
+            'count': len(products),
+            'total': search_engine.get_product_count(),
+            'next_cursor': next_cursor,
+            'products': [p.to_dict() for p in products]
+        })
+    
+    try:
+        products = search_engine.sort_products(sort_by=sort_spec, order=order, algorithm=algorithm, limit=limit)
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
     
     return jsonify({
         'success': True,
         'count': len(products),
+        'total': search_engine.get_product_count(),
         'products': [p.to_dict() for p in products]
     })
 
@@ -208,6 +248,27 @@ def search_products():
     
     # Search by name (if ID search didn't find anything or query is not numeric)
     if not results:
+        page_size = request.args.get('page_size', type=int)
+        cursor = request.args.get('cursor')
+        
+        # Keyset pagination when a page size or cursor is given
+        if page_size is not None or cursor:
+            try:
+                results, next_cursor = search_engine.search_page(
+                    query, page_size=20 if page_size is None else page_size, cursor=cursor)
+            except ValueError as e:
+                return jsonify({
+                    'success': False,
+                    'error': str(e)
+                }), 400
+            
+            return jsonify({
+                'success': True,
+                'count': len(results),
+                'next_cursor': next_cursor,
+                'products': [p.to_dict() for p in results]
+            })
+        
         results = search_engine.search_by_name(query, use_binary=True)
     
     return jsonify({
@@ -239,6 +300,14 @@ def add_product():
     """Add a new product."""
     try:
         data = request.json
+        if not isinstance(data['product_id'], int) or isinstance(data['product_id'], bool):
+            raise ValueError("product_id must be an integer")
+        if not -(1 << 63) <= data['product_id'] < (1 << 63):
+            raise ValueError("product_id must fit in a signed 64-bit integer")
+        if not isinstance(data['name'], str):
+            raise ValueError("name must be a string")
+        if data.get('category') is not None and not isinstance(data['category'], str):
+            raise ValueError("category must be a string")
         product = Product(
             product_id=data['product_id'],
             name=data['name'],
@@ -248,6 +317,8 @@ def add_product():
             image_url=data.get('image_url'),
             category=data.get('category')
         )
+        if not (math.isfinite(product.price) and math.isfinite(product.rating)):
+            raise ValueError("price and rating must be finite numbers")
         search_engine.add_product(product)
         
         return jsonify({
@@ -283,7 +354,17 @@ def get_stats():
     """Get catalog statistics."""
     return jsonify({
         'success': True,
-        'total_products': search_engine.get_product_count()
+        'total_products': search_engine.get_product_count(),
+        'catalog': search_engine.stats.to_dict()
+    })
+
+
+@app.route('/api/stats/index', methods=['GET'])
+def get_index_stats():
+    """Get hash table statistics of the product ID index."""
+    return jsonify({
+        'success': True,
+        'index': search_engine.index_stats()
     })
 
 
@@ -328,6 +409,38 @@ def get_category_recommendations(category):
     })
 
 
+@app.route('/api/recommendations/price-range', methods=['GET'])
+def get_price_range_recommendations():
+    """Get the best rated products priced near a given price."""
+    price = request.args.get('price', type=float)
+    if price is None:
+        return jsonify({
+            'success': False,
+            'error': 'price is required'
+        }), 400
+    tolerance = request.args.get('tolerance', 0.3, type=float)
+    if not (math.isfinite(price) and math.isfinite(tolerance)):
+        return jsonify({
+            'success': False,
+            'error': 'price and tolerance must be finite numbers'
+        }), 400
+    limit = request.args.get('limit', 5, type=int)
+    if limit < 0:
+        return jsonify({
+            'success': False,
+            'error': 'limit must not be negative'
+        }), 400
+    products = recommendation_engine.get_similar_price_range(price, tolerance=tolerance, limit=limit)
+    
+    return jsonify({
+        'success': True,
+        'price': price,
+        'tolerance': tolerance,
+        'count': len(products),
+        'products': [p.to_dict() for p in products]
+    })
+
+
 if __name__ == '__main__':
     app.run(debug=True, port=5000)
 
@@ -0,0 +1,139 @@
+"""
+Recall-vs-latency report of approximate recommendation candidates.
+
+Compares RecommendationEngine.approximate_candidates() against the exact
+brute-force ranking on a synthetic catalog, and times get_recommendations()
+on both paths:
+
+    python benchmark_recommendations.py --products 100000 --samples 50
+"""
+
+import argparse
+import random
+import time
+
+from product import Product
+from search_engine import SearchEngine
+from recommendation_engine import RecommendationEngine
+
+
+CATEGORIES = ['Laptops', 'Monitors', 'Accessories', 'Audio', 'Smartphones',
+              'Tablets', 'Storage', 'Cables', 'Cameras', 'Networking']
+
+
+def build_catalog(size, seed=0):
+    """
+    Build a search engine holding a synthetic catalog.
+
+    Args:
+        size: Number of products
+        seed: Random seed
+
+    Returns:
+        Tuple (SearchEngine, RecommendationEngine)
+    """
+    rng = random.Random(seed)
+    words = ['%s%s' % (rng.choice('bcdfghklmnprstvz'), rng.choice(['ax', 'ero', 'ion', 'ulo', 'yte', 'ora']))
+             + str(i) for i in range(2000)]
+    engine = SearchEngine()
+    recommender = RecommendationEngine(engine)
+    products = []
+    for product_id in range(size):
+        category = rng.choice(CATEGORIES)
+        name = ' '.join(rng.choice(words[:200] if k == 0 else words) for k in range(rng.randint(2, 4)))
+        products.append(Product(product_id, name.title(), round(rng.lognormvariate(4.5, 1.2), 2),
+                                round(rng.uniform(2.5, 5.0), 1), rng.randint(0, 10000), category=category))
+    engine.add_products(products)
+    return engine, recommender
+
+
+def recall_report(engine, recommender, samples=50, k=12, candidate_counts=(100, 300, 1000), seed=1):
+    """
+    Measure recall@k and latency of approximate candidates against brute force.
+
+    Args:
+        engine: SearchEngine with the catalog
+        recommender: RecommendationEngine over the same catalog
+        samples: Number of target products
+        k: Neighbors compared per target
+        candidate_counts: Approximate candidate counts to evaluate
+        seed: Random seed for picking targets
+
+    Returns:
+        List of dicts with 'method', 'candidates', 'recall' and 'latency_ms'
+    """
+    targets = random.Random(seed).sample(engine.get_all_products(), samples)
+
+    start = time.perf_counter()
+    exact = {}
+    for target in targets:
+        top, _, _ = recommender._top_candidates(target, k)
+        exact[target.product_id] = {p.product_id for p, _ in top}
+    elapsed = time.perf_counter() - start
+    report = [{'method': 'brute force', 'candidates': engine.get_product_count() - 1,
+               'recall': 1.0, 'latency_ms': elapsed / samples * 1000}]
+
+    for count in candidate_counts:
+        found = 0
+        start = time.perf_counter()
+        for target in targets:
+            top = recommender.approximate_candidates(target, count)[:k]
+            found += len(exact[target.product_id] & {p.product_id for p, _ in top})
+        elapsed = time.perf_counter() - start
+        report.append({'method': 'minhash lsh', 'candidates': count,
+                       'recall': found / (samples * k), 'latency_ms': elapsed / samples * 1000})
+    return report
+
+
+def recommendation_report(engine, recommender, samples=50, limit=12, seed=2):
+    """
+    Time get_recommendations() on the exact and the approximate path.
+    Each target is requested once, as for a cold neighbor table.
+
+    Args:
+        engine: SearchEngine with the catalog
+        recommender: RecommendationEngine over the same catalog
+        samples: Number of target products
+        limit: Recommendations per request
+        seed: Random seed for picking targets
+
+    Returns:
+        Dict mapping 'exact' and 'approximate' to the mean latency in ms
+    """
+    targets = random.Random(seed).sample(engine.get_all_products(), samples)
+    report = {}
+    for method, approximate in (('exact', False), ('approximate', True)):
+        start = time.perf_counter()
+        for target in targets:
+            recommender.get_recommendations(target.product_id, limit, approximate=approximate)
+        report[method] = (time.perf_counter() - start) / samples * 1000
+    return report
+
+
+def main():
+    """Build a catalog and print the recall-vs-latency table."""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--products', type=int, default=20000, help='catalog size')
+    parser.add_argument('--samples', type=int, default=50, help='target products measured')
+    parser.add_argument('--k', type=int, default=12, help='neighbors compared per target')
+    parser.add_argument('--candidates', type=int, nargs='+', default=[100, 300, 1000],
+                        help='approximate candidate counts')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    engine, recommender = build_catalog(args.products)
+    print(f"Built {args.products} products in {time.perf_counter() - start:.1f}s")
+    start = time.perf_counter()
+    recommender._build_approximate_index()
+    print(f"Built the approximate index in {time.perf_counter() - start:.1f}s")
+
+    print(f"{'method':<12} {'candidates':>10} {'recall@' + str(args.k):>10} {'latency':>12}")
+    for row in recall_report(engine, recommender, args.samples, args.k, args.candidates):
+        print(f"{row['method']:<12} {row['candidates']:>10} {row['recall']:>10.3f} {row['latency_ms']:>9.2f} ms")
+
+    latency = recommendation_report(engine, recommender, args.samples, args.k)
+    print(f"get_recommendations: exact {latency['exact']:.2f} ms, approximate {latency['approximate']:.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -2,6 +2,7 @@
 Binary Search implementation for fast product lookup.
 """
 
+from bisect import bisect_left
 from product import Product
 
 
@@ -62,6 +63,8 @@ def binary_search_partial_name(products, name):
     """
     Binary search for products with partial name match.
     Uses binary search to find starting position, then linear search.
+    The substring test is not monotone over name order, so matches in the
+    middle of names can be missed; prefer binary_search_prefix_range().
     
     Args:
         products: Sorted list of products (by name)
@@ -107,3 +110,24 @@ def binary_search_partial_name(products, name):
     return results
 
 
+def binary_search_prefix_range(keys, prefix):
+    """
+    Find the range of keys starting with a prefix using two bisections.
+    
+    Args:
+        keys: Sorted list of lowercased name keys
+        prefix: Lowercased prefix to search for
+        
+    Returns:
+        Tuple (lo, hi) such that keys[lo:hi] are exactly the keys with the prefix
+    """
+    lo = bisect_left(keys, prefix)
+    # Trailing U+10FFFF cannot be incremented; every longer key with the
+    # remaining stem sorts below the incremented stem all the same
+    stem = prefix.rstrip('\U0010ffff')
+    if not stem:
+        return lo, len(keys)
+    # Smallest string greater than every string starting with prefix
+    upper = stem[:-1] + chr(ord(stem[-1]) + 1)
+    hi = bisect_left(keys, upper, lo)
+    return lo, hi
@@ -0,0 +1,106 @@
+"""
+Incrementally maintained catalog statistics (min / max / sum per numeric field).
+"""
+
+import heapq
+from collections import Counter
+
+
+class CatalogStats:
+    """Running count, sum, min and max of product price, rating and popularity."""
+
+    FIELDS = ('price', 'rating', 'popularity')
+
+    def __init__(self):
+        """Initialize empty statistics."""
+        self.count = 0
+        self.sums = {field: 0 for field in self.FIELDS}
+        # Min/max heaps with lazy deletion: removed values are skipped when they surface
+        self._min_heaps = {field: [] for field in self.FIELDS}
+        self._max_heaps = {field: [] for field in self.FIELDS}  # Negated values
+        self._min_removed = {field: Counter() for field in self.FIELDS}
+        self._max_removed = {field: Counter() for field in self.FIELDS}
+
+    def add(self, product):
+        """
+        Account for a product added to the catalog.
+
+        Args:
+            product: Product object that was added
+        """
+        self.count += 1
+        for field in self.FIELDS:
+            value = getattr(product, field)
+            self.sums[field] += value
+            heapq.heappush(self._min_heaps[field], value)
+            heapq.heappush(self._max_heaps[field], -value)
+
+    def remove(self, product):
+        """
+        Account for a product removed from the catalog.
+
+        Args:
+            product: Product object that was removed (as it was added)
+        """
+        self.count -= 1
+        for field in self.FIELDS:
+            value = getattr(product, field)
+            self.sums[field] -= value
+            self._min_removed[field][value] += 1
+            self._max_removed[field][-value] += 1
+            if len(self._min_heaps[field]) > 2 * self.count + 64:
+                self._compact(field)
+
+    def _prune(self, heap, removed):
+        """Pop values pending removal off the top of a heap."""
+        while heap and removed[heap[0]]:
+            removed[heap[0]] -= 1
+            if not removed[heap[0]]:
+                del removed[heap[0]]
+            heapq.heappop(heap)
+
+    def _compact(self, field):
+        """Rebuild a field's heaps without the values pending removal."""
+        for heaps, pending in ((self._min_heaps, self._min_removed),
+                               (self._max_heaps, self._max_removed)):
+            removed = pending[field]
+            kept = []
+            for value in heaps[field]:
+                if removed[value]:
+                    removed[value] -= 1
+                else:
+                    kept.append(value)
+            heapq.heapify(kept)
+            heaps[field] = kept
+            pending[field] = Counter()
+
+    def min(self, field):
+        """Smallest value of a field, or None for an empty catalog."""
+        heap = self._min_heaps[field]
+        self._prune(heap, self._min_removed[field])
+        return heap[0] if heap else None
+
+    def max(self, field):
+        """Largest value of a field, or None for an empty catalog."""
+        heap = self._max_heaps[field]
+        self._prune(heap, self._max_removed[field])
+        return -heap[0] if heap else None
+
+    def sum(self, field):
+        """Sum of a field over the catalog."""
+        return self.sums[field]
+
+    def mean(self, field):
+        """Average of a field, or None for an empty catalog."""
+        return self.sums[field] / self.count if self.count else None
+
+    def to_dict(self):
+        """Convert statistics to a dictionary for JSON serialization."""
+        return {
+            field: {
+                'min': self.min(field),
+                'max': self.max(field),
+                'avg': self.mean(field),
+            }
+            for field in self.FIELDS
+        }
@@ -0,0 +1,356 @@
+"""
+Columnar product features for vectorized recommendation scoring (requires NumPy).
+"""
+
+try:
+    import numpy as np
+except ImportError:  # Scoring falls back to the per-candidate Python path
+    np = None
+
+
+class FeatureMatrix:
+    """
+    Per-product feature columns kept in sync with the catalog.
+
+    Each product occupies one row: category code, price-tier index, rating,
+    popularity, keyword-token count and insertion sequence. Rows are filled
+    densely; removing a product moves the last row into its place.
+    """
+
+    def __init__(self, category_score, tier_scores, capacity=64):
+        """
+        Initialize an empty feature matrix.
+
+        Args:
+            category_score: Function (category1, category2) -> relationship score
+            tier_scores: Square list of price-tier similarity scores
+            capacity: Initial number of preallocated rows
+        """
+        self.category_score = category_score
+        self.tier_matrix = np.array(tier_scores, dtype=np.float64)
+        self.categories = {}  # category -> code
+        self.category_matrix = np.zeros((0, 0), dtype=np.float64)
+
+        self.size = 0
+        self.products = []  # row -> product
+        self.row_of = {}  # product ID -> row
+        self.token_postings = {}  # token ID -> set of product IDs
+        self.posting_rows = None  # token ID -> array of rows (snapshots only)
+        self.group_order = None  # rows by (category, tier) group and group bounds, until a change
+        self._allocate(capacity)
+
+    def _allocate(self, capacity):
+        """Grow the column arrays to hold `capacity` rows."""
+        def grow(old, dtype):
+            column = np.zeros(capacity, dtype=dtype)
+            if old is not None:
+                column[:self.size] = old[:self.size]
+            return column
+
+        self.category_codes = grow(getattr(self, 'category_codes', None), np.intp)
+        self.tiers = grow(getattr(self, 'tiers', None), np.intp)
+        self.ratings = grow(getattr(self, 'ratings', None), np.float64)
+        self.popularity = grow(getattr(self, 'popularity', None), np.float64)
+        self.token_counts = grow(getattr(self, 'token_counts', None), np.float64)
+        self.sequence = grow(getattr(self, 'sequence', None), np.int64)
+        self.capacity = capacity
+
+    def _category_code(self, category):
+        """Get the code of a category, extending the lookup matrix for new ones."""
+        code = self.categories.get(category)
+        if code is None:
+            code = self.categories[category] = len(self.categories)
+            names = list(self.categories)
+            self.category_matrix = np.array(
+                [[self.category_score(a, b) for b in names] for a in names], dtype=np.float64)
+        return code
+
+    def add(self, product, tier, tokens, sequence):
+        """
+        Add (or replace) a product's feature row.
+
+        Args:
+            product: Product object
+            tier: Price-tier index of the product
+            tokens: Frozenset of keyword token IDs
+            sequence: Catalog insertion sequence (tie-break order)
+        """
+        if product.product_id in self.row_of:
+            self.remove(product.product_id)
+        if self.size == self.capacity:
+            self._allocate(self.capacity * 2)
+
+        row = self.size
+        self.size += 1
+        self.group_order = None
+        self.products.append(product)
+        self.row_of[product.product_id] = row
+        self.category_codes[row] = self._category_code(product.category)
+        self.tiers[row] = tier
+        self.ratings[row] = product.rating
+        self.popularity[row] = product.popularity
+        self.token_counts[row] = len(tokens)
+        self.sequence[row] = sequence
+        for token in tokens:
+            self.token_postings.setdefault(token, set()).add(product.product_id)
+
+    def remove(self, product_id, tokens=None):
+        """
+        Remove a product's feature row.
+
+        Args:
+            product_id: ID of the product to remove
+            tokens: The product's token IDs, if known (saves a posting scan)
+
+        Returns:
+            True if removed, False if not present
+        """
+        row = self.row_of.pop(product_id, None)
+        if row is None:
+            return False
+
+        if tokens is None:
+            tokens = [t for t, ids in self.token_postings.items() if product_id in ids]
+        for token in tokens:
+            posting = self.token_postings.get(token)
+            if posting is not None:
+                posting.discard(product_id)
+                if not posting:
+                    del self.token_postings[token]
+
+        last = self.size - 1
+        moved = self.products.pop()
+        if row != last:
+            self.products[row] = moved
+            self.row_of[moved.product_id] = row
+            for column in (self.category_codes, self.tiers, self.ratings,
+                           self.popularity, self.token_counts, self.sequence):
+                column[row] = column[last]
+        self.size = last
+        self.group_order = None
+        return True
+
+    def name_similarities(self, tokens, rows=None):
+        """
+        Jaccard similarity of every row's tokens with a token set.
+
+        Only rows sharing a token are touched, via the token postings.
+
+        Args:
+            tokens: Frozenset of keyword token IDs of the target
+            rows: Array of rows to score (default: every row)
+
+        Returns:
+            Array of name similarities, one per scored row
+        """
+        n = self.size if rows is None else len(rows)
+        scores = np.zeros(n, dtype=np.float64)
+        if not tokens:
+            return scores
+
+        shared = np.zeros(n, dtype=np.float64)
+        if rows is not None:
+            # A few rows: look each one up in the postings instead
+            ids = [self.products[row].product_id for row in rows.tolist()]
+            for token in tokens:
+                posting = self.token_postings.get(token)
+                if posting:
+                    shared += np.fromiter((pid in posting for pid in ids), dtype=np.float64, count=n)
+            counts = self.token_counts[rows]
+        else:
+            row_of = self.row_of
+            for token in tokens:
+                if self.posting_rows is not None:
+                    matched = self.posting_rows.get(token)
+                    if matched is not None:
+                        shared[matched] += 1
+                    continue
+                posting = self.token_postings.get(token)
+                if posting:
+                    matched = np.fromiter((row_of[pid] for pid in posting), dtype=np.intp, count=len(posting))
+                    shared[matched] += 1
+            counts = self.token_counts[:n]
+
+        union = counts + len(tokens) - shared
+        hit = (shared > 0) & (counts > 0)
+        scores[hit] = shared[hit] / union[hit]
+        return scores
+
+    def similarities(self, category_row, tokens, tier, rating, popularity, popularity_range, rows=None):
+        """
+        Similarity of a target's features with every row (or the given rows).
+
+        Args:
+            category_row: Category relationship scores of the target's category,
+                indexed by category code
+            tokens: Frozenset of keyword token IDs of the target
+            tier: Price-tier index of the target
+            rating: Rating of the target
+            popularity: Popularity of the target
+            popularity_range: (min, max) catalog popularity, or None if empty
+            rows: Array of rows to score (default: every row)
+
+        Returns:
+            Array of similarity scores, one per scored row
+        """
+        n = self.size if rows is None else len(rows)
+        columns = slice(0, n) if rows is None else rows
+
+        # 1. Category relationship: gather from the category lookup matrix
+        category_scores = category_row[self.category_codes[columns]] if len(category_row) else np.zeros(n)
+
+        # 2. Name/Keyword similarity over the token postings
+        name_sims = self.name_similarities(tokens, rows)
+
+        # 3. Price tier similarity: gather from the tier lookup matrix
+        tier_sims = self.tier_matrix[tier][self.tiers[columns]]
+
+        # 4. Rating similarity
+        rating_sims = np.maximum(0, 1 - (np.abs(rating - self.ratings[columns]) / 2.5))
+
+        # 5. Popularity similarity
+        if popularity_range is not None:
+            min_pop, max_pop = popularity_range
+            pop_range = max_pop - min_pop if max_pop > min_pop else 1
+            norm_pop1 = (popularity - min_pop) / pop_range
+            norm_pops = (self.popularity[columns] - min_pop) / pop_range
+            pop_sims = 1 - np.abs(norm_pop1 - norm_pops)
+        else:
+            pop_sims = 0.5
+
+        similarity = (
+            category_scores * 0.35 +
+            name_sims * 0.25 +
+            tier_sims * 0.20 +
+            rating_sims * 0.15 +
+            pop_sims * 0.05
+        )
+
+        boost = (category_scores == 1.0) & (tier_sims >= 0.7)
+        similarity[boost] = np.minimum(1.0, similarity[boost] * 1.1)
+        return similarity
+
+    def top_rows(self, scores, count, exclude=None, per_group=0):
+        """
+        Rows of the `count` highest scores, best first (ties in insertion order).
+
+        Args:
+            scores: Array of scores, one per row
+            count: Number of rows to select
+            exclude: Row to leave out (the target itself), or None
+            per_group: Also include the best `per_group` rows of every
+                (category, price tier) group
+
+        Returns:
+            Tuple (array of rows, number of candidate rows)
+        """
+        candidates = np.arange(self.size)
+        if exclude is not None:
+            candidates = candidates[candidates != exclude]
+        total = len(candidates)
+        rows = candidates
+        if count < total:
+            # Keep everything scoring at least the count-th best, then order exactly
+            candidate_scores = scores[rows]
+            threshold = np.partition(candidate_scores, total - count)[total - count]
+            rows = rows[candidate_scores >= threshold]
+        rows = rows[np.lexsort((self.sequence[rows], -scores[rows]))][:count]
+
+        if per_group and count < total:
+            # Add the best rows of each (category, tier) group, selected within
+            # the group by partition (ties ordered exactly)
+            order, bounds = self._group_order()
+            group_scores = scores[:self.size].copy()
+            if exclude is not None:
+                group_scores[exclude] = -np.inf
+            heads = []
+            for start, end in zip(bounds[:-1].tolist(), bounds[1:].tolist()):
+                members = order[start:end]
+                if end - start > per_group:
+                    member_scores = group_scores[members]
+                    threshold = np.partition(member_scores, end - start - per_group)[end - start - per_group]
+                    members = members[member_scores >= threshold]
+                    if len(members) > per_group:
+                        members = members[np.lexsort((self.sequence[members], -scores[members]))][:per_group]
+                heads.append(members)
+            heads = np.concatenate(heads)
+            if exclude is not None:
+                heads = heads[heads != exclude]
+            rows = np.union1d(rows, heads)
+            rows = rows[np.lexsort((self.sequence[rows], -scores[rows]))]
+        return rows, total
+
+    def _group_order(self):
+        """
+        Rows sorted by (category, tier) group, with the group boundaries.
+        Cached until the next add or remove.
+        """
+        if self.group_order is None:
+            n = self.size
+            groups = self.category_codes[:n] * len(self.tier_matrix) + self.tiers[:n]
+            order = np.argsort(groups, kind='stable')
+            sorted_groups = groups[order]
+            starts = np.flatnonzero(np.r_[True, sorted_groups[1:] != sorted_groups[:-1]])
+            self.group_order = (order, np.r_[starts, n])
+        return self.group_order
+
+    def snapshot(self, tokens):
+        """
+        Compact, picklable copy of the feature columns for worker processes.
+
+        Args:
+            tokens: Function mapping a product to its token IDs
+
+        Returns:
+            Dictionary of arrays; see from_snapshot()
+        """
+        n = self.size
+        row_tokens = [sorted(tokens(product)) for product in self.products]
+        return {
+            'tier_matrix': self.tier_matrix,
+            'category_matrix': self.category_matrix,
+            'category_codes': self.category_codes[:n].astype(np.int32),
+            'tiers': self.tiers[:n].astype(np.int8),
+            'ratings': self.ratings[:n].copy(),
+            'popularity': self.popularity[:n].copy(),
+            'sequence': self.sequence[:n].copy(),
+            # Token IDs per row in compressed sparse row form
+            'token_indptr': np.cumsum([0] + [len(t) for t in row_tokens], dtype=np.int64),
+            'token_indices': np.fromiter((t for ts in row_tokens for t in ts), dtype=np.int64),
+        }
+
+    @classmethod
+    def from_snapshot(cls, snapshot):
+        """
+        Rebuild a read-only feature matrix (rows without products) from snapshot().
+
+        Args:
+            snapshot: Dictionary produced by snapshot()
+
+        Returns:
+            FeatureMatrix over the same rows
+        """
+        matrix = cls.__new__(cls)
+        n = len(snapshot['ratings'])
+        matrix.tier_matrix = snapshot['tier_matrix']
+        matrix.category_matrix = snapshot['category_matrix']
+        matrix.size = matrix.capacity = n
+        matrix.group_order = None
+        matrix.category_codes = snapshot['category_codes'].astype(np.intp)
+        matrix.tiers = snapshot['tiers'].astype(np.intp)
+        matrix.ratings = snapshot['ratings']
+        matrix.popularity = snapshot['popularity']
+        matrix.sequence = snapshot['sequence']
+        indptr, indices = snapshot['token_indptr'], snapshot['token_indices']
+        matrix.token_counts = np.diff(indptr).astype(np.float64)
+        matrix.row_tokens = [frozenset(indices[indptr[i]:indptr[i + 1]].tolist()) for i in range(n)]
+        # Postings as row arrays: group row numbers by token
+        order = np.argsort(indices, kind='stable')
+        rows = np.repeat(np.arange(n), np.diff(indptr))[order]
+        tokens, starts = np.unique(indices[order], return_index=True)
+        matrix.posting_rows = dict(zip(tokens.tolist(), np.split(rows, starts[1:])))
+        matrix.categories, matrix.products, matrix.row_of, matrix.token_postings = {}, [], {}, {}
+        return matrix
+
+    def __len__(self):
+        return self.size
@@ -2,10 +2,189 @@
 Hash Table implementation with Separate Chaining and Open Addressing.
 """
 
-from product import Product
+import functools
+import sys
+import time
+from array import array
+from collections import deque
 
 
-class HashTableSeparateChaining:
+def _merge_by_id(existing, products):
+    """Products keyed by ID in first-seen order, later duplicates replacing earlier ones."""
+    merged = {product.product_id: product for product in existing}
+    for product in products:
+        merged[product.product_id] = product
+    return merged
+
+
+def _histogram(lengths):
+    """List whose k-th entry counts the lengths equal to k."""
+    histogram = []
+    for length in lengths:
+        if length >= len(histogram):
+            histogram.extend([0] * (length + 1 - len(histogram)))
+        histogram[length] += 1
+    return histogram
+
+
+def _table_stats(table, chains, probes, bytes_used):
+    """Stats dict shared by the hash tables (see HashTableSeparateChaining.stats)."""
+    chain_histogram = _histogram(chains)
+    probe_histogram = _histogram(probes)
+    probed = sum(probe_histogram)
+    stats = {
+        'type': type(table).__name__,
+        'size': table.size,
+        'count': table.count,
+        'load_factor': table.count / table.size,
+        'tombstones': table.tombstones,
+        'chain_histogram': chain_histogram,
+        'max_chain': len(chain_histogram) - 1 if chain_histogram else 0,
+        'probe_histogram': probe_histogram,
+        'max_probe': len(probe_histogram) - 1 if probe_histogram else 0,
+        'average_probe': sum(k * n for k, n in enumerate(probe_histogram)) / probed if probed else 0.0,
+        'bytes': bytes_used,
+    }
+    resize_stats = table.resize_stats
+    stats.update(dict.fromkeys(ResizeStats.FIELDS) if resize_stats is None else resize_stats.to_dict())
+    return stats
+
+
+def _records_resize(resize):
+    """Decorator timing each resize into table.resize_stats while stats are enabled."""
+    @functools.wraps(resize)
+    def wrapper(self):
+        resize_stats = self.resize_stats
+        if resize_stats is None:
+            return resize(self)
+        old_size = self.size
+        start = time.perf_counter()
+        resize(self)
+        resize_stats.record(old_size, self.size, time.perf_counter() - start)
+    return wrapper
+
+
+class ResizeStats:
+    """
+    Running totals of hash table rebuilds, and the most recent ones.
+    Growth (resizes) and same-size rehashes that purge tombstones are
+    counted separately; only the last RECENT events are kept.
+    """
+    
+    RECENT = 16
+    FIELDS = ('resize_count', 'resize_seconds', 'rehash_count', 'rehash_seconds', 'recent_resizes')
+    
+    def __init__(self):
+        """Initialize empty totals."""
+        self.resize_count = 0
+        self.resize_seconds = 0.0
+        self.rehash_count = 0
+        self.rehash_seconds = 0.0
+        self.recent = deque(maxlen=self.RECENT)
+    
+    def record(self, old_size, new_size, seconds):
+        """
+        Account for one rebuild.
+        
+        Args:
+            old_size: Table size before the rebuild
+            new_size: Table size after it (equal for a rehash)
+            seconds: Duration of the rebuild
+        """
+        if new_size == old_size:
+            self.rehash_count += 1
+            self.rehash_seconds += seconds
+        else:
+            self.resize_count += 1
+            self.resize_seconds += seconds
+        self.recent.append({'from_size': old_size, 'to_size': new_size, 'seconds': seconds})
+    
+    def to_dict(self):
+        """Convert the totals and recent events to a dictionary (keys in FIELDS)."""
+        return {
+            'resize_count': self.resize_count,
+            'resize_seconds': self.resize_seconds,
+            'rehash_count': self.rehash_count,
+            'rehash_seconds': self.rehash_seconds,
+            'recent_resizes': [dict(event) for event in self.recent],
+        }
+
+
+class _HashTableBase:
+    """
+    Batch loading and resize tracking shared by the hash tables.
+    Subclasses provide _capacity(count) and _rebuild(size, products).
+    """
+    
+    MAX_LOAD = 0.75  # Load factor the table grows beyond
+    
+    def bulk_load(self, products, expected_size=None):
+        """
+        Insert many products, sizing the table once and filling it directly
+        (no per-insert duplicate scans or resize checks).
+        A product whose ID is already present replaces the old one.
+        A non-empty table that holds the batch without growing is updated
+        in place instead of rebuilt; a table that must grow at least
+        doubles, like a resize, so repeated batches stay amortized. With
+        stats enabled, rebuilding a non-empty table is recorded as a resize
+        (or a rehash, at the same size); loading an empty one is not.
+        
+        Args:
+            products: Iterable of Product objects
+            expected_size: Number of products the table should hold without
+                resizing (default: the resulting count)
+        
+        Raises:
+            TypeError, ValueError: If a product ID cannot be stored (see
+                check_key); the table is left unchanged
+        """
+        products = list(products)
+        for product in products:
+            self.check_key(product.product_id)
+        occupied = self.count + self.tombstones
+        if self.count and max(occupied + len(products), expected_size or 0) <= self.size * self.MAX_LOAD:
+            for product in products:
+                self.insert_product(product)
+            return
+        
+        merged = _merge_by_id(self.get_all_products(), products)
+        expected = max(len(merged), expected_size or 0)
+        old_size, had_entries = self.size, self.count > 0
+        size = old_size
+        if expected > size * self.MAX_LOAD:
+            size = self._capacity(max(expected, int(size * 2 * self.MAX_LOAD)))
+        start = time.perf_counter()
+        self._rebuild(size, merged.values())
+        if self.resize_stats is not None and had_entries:
+            # Rebuilding a filled table counts like a resize (or a same-size rehash)
+            self.resize_stats.record(old_size, size, time.perf_counter() - start)
+    
+    def check_key(self, key):
+        """
+        Check that a product ID can be stored, before changing anything.
+        String folding hashes any key, so only tables with restricted
+        keys override this.
+        """
+    
+    def _capacity(self, count):
+        """Table size holding `count` entries within MAX_LOAD."""
+        return self._next_prime(int(count / self.MAX_LOAD) + 1)
+    
+    def enable_stats(self, resize_stats=None):
+        """
+        Start recording resizes (shape stats need no tracking).
+        
+        Args:
+            resize_stats: ResizeStats to continue, e.g. from a replaced table
+                (default: new totals)
+        """
+        if resize_stats is not None:
+            self.resize_stats = resize_stats
+        elif self.resize_stats is None:
+            self.resize_stats = ResizeStats()
+
+
+class HashTableSeparateChaining(_HashTableBase):
     """Hash table using separate chaining for collision resolution."""
     
     def __init__(self, size=101):
@@ -18,6 +197,8 @@ class HashTableSeparateChaining:
         self.size = size
         self.table = [[] for _ in range(size)]
         self.count = 0
+        self.tombstones = 0  # Chains never leave tombstones
+        self.resize_stats = None  # ResizeStats once enable_stats() is called
     
     def _hash(self, key):
         """Hash function using string folding."""
@@ -53,6 +234,7 @@ class HashTableSeparateChaining:
         if self.count > self.size * 0.75:
             self._resize()
     
+    @_records_resize
     def _resize(self):
         """Resize the hash table when load factor is too high."""
         old_table = self.table
@@ -66,6 +248,17 @@ class HashTableSeparateChaining:
             for product in bucket:
                 self.insert_product(product)
     
+    def _rebuild(self, size, products):
+        """Refill `size` empty buckets with distinct products (see bulk_load)."""
+        self.size = size
+        table = [[] for _ in range(size)]
+        self.table = table
+        count = 0
+        for product in products:
+            table[self._hash(product.product_id)].append(product)
+            count += 1
+        self.count = count
+    
     def _next_prime(self, n):
         """Find the next prime number >= n."""
         if n <= 2:
@@ -141,6 +334,24 @@ class HashTableSeparateChaining:
                 return True
         return False
     
+    def stats(self):
+        """
+        Snapshot of the table's shape, computed on demand.
+        
+        Returns:
+            Dict with size, count, load_factor, tombstones, chain_histogram
+            (number of buckets per chain length), max_chain, probe_histogram
+            (number of keys per probes a successful lookup takes), max_probe,
+            average_probe, bytes (table structure, excluding the products) and
+            the ResizeStats totals (resize_count, resize_seconds, rehash_count,
+            rehash_seconds, recent_resizes), which are None unless
+            enable_stats() was called
+        """
+        table = self.table
+        probes = (k for bucket in table for k in range(1, len(bucket) + 1))
+        bytes_used = sys.getsizeof(table) + sum(sys.getsizeof(bucket) for bucket in table)
+        return _table_stats(self, (len(bucket) for bucket in table), probes, bytes_used)
+    
     def get_all_products(self):
         """Get all products from the hash table."""
         products = []
@@ -149,7 +360,7 @@ class HashTableSeparateChaining:
         return products
 
 
-class HashTableOpenAddressing:
+class HashTableOpenAddressing(_HashTableBase):
     """Hash table using open addressing (linear probing) for collision resolution."""
     
     def __init__(self, size=101):
@@ -161,8 +372,10 @@ class HashTableOpenAddressing:
         """
         self.size = size
         self.table = [None] * size
-        self.count = 0
+        self.count = 0  # Live entries
+        self.tombstones = 0  # DELETED markers; they lengthen probes like live entries
         self.DELETED = object()  # Marker for deleted entries
+        self.resize_stats = None  # ResizeStats once enable_stats() is called
     
     def _hash(self, key):
         """Hash function using string folding."""
@@ -176,24 +389,32 @@ class HashTableOpenAddressing:
     
     def _probe(self, key, start_index):
         """
-        Linear probing to find next available slot.
+        Linear probing to find the slot for a key: the slot holding the key
+        if present, otherwise the first deleted or empty slot on its path.
         
         Args:
             key: The key to hash
             start_index: Starting index from hash function
             
         Returns:
-            Index of available slot
+            Index of the key's slot or of an available slot
         """
         index = start_index
         attempts = 0
+        first_deleted = None
         while attempts < self.size:
-            if self.table[index] is None or self.table[index] == self.DELETED:
-                return index
-            if isinstance(self.table[index], Product) and self.table[index].product_id == key:
+            item = self.table[index]
+            if item is None:
+                return index if first_deleted is None else first_deleted
+            if item is self.DELETED:
+                if first_deleted is None:
+                    first_deleted = index
+            elif item.product_id == key:
                 return index
             index = (index + 1) % self.size
             attempts += 1
+        if first_deleted is not None:
+            return first_deleted
         raise Exception("Hash table is full")
     
     def insert_product(self, product):
@@ -207,27 +428,59 @@ class HashTableOpenAddressing:
         start_index = self._hash(key)
         index = self._probe(key, start_index)
         
-        if self.table[index] is None or self.table[index] == self.DELETED:
+        if self.table[index] is self.DELETED:
+            self.tombstones -= 1
+            self.count += 1
+        elif self.table[index] is None:
             self.count += 1
         
         self.table[index] = product
         
-        # Resize if load factor > 0.75
-        if self.count > self.size * 0.75:
+        # Resize if load factor > 0.75, counting tombstones as occupied
+        if self.count + self.tombstones > self.size * 0.75:
             self._resize()
     
+    @_records_resize
     def _resize(self):
-        """Resize the hash table when load factor is too high."""
-        old_table = self.table
-        old_size = self.size
-        self.size = self._next_prime(self.size * 2)
-        self.table = [None] * self.size
+        """
+        Rehash when occupied slots (live + deleted) exceed the load factor.
+        The table only grows when live entries fill at least half of the
+        occupied slots; when tombstones dominate it is rehashed at the same
+        size, dropping them.
+        """
+        live = [item for item in self.table if item is not None and item is not self.DELETED]
+        if self.count > self.size * 0.75 / 2:
+            self.size = self._next_prime(self.size * 2)
+            self.table = [None] * self.size
+        else:
+            table = self.table
+            for i in range(self.size):
+                table[i] = None
         self.count = 0
+        self.tombstones = 0
         
         # Rehash all elements
-        for item in old_table:
-            if item is not None and item != self.DELETED:
-                self.insert_product(item)
+        for item in live:
+            self.insert_product(item)
+    
+    def _rebuild(self, size, products):
+        """
+        Refill `size` empty slots with distinct products (see bulk_load),
+        each in the first free slot of its probe sequence: the new table
+        has no duplicates or tombstones to check for.
+        """
+        self.size = size
+        table = [None] * size
+        self.table = table
+        count = 0
+        for product in products:
+            index = self._hash(product.product_id)
+            while table[index] is not None:
+                index = (index + 1) % size
+            table[index] = product
+            count += 1
+        self.count = count
+        self.tombstones = 0
     
     def _next_prime(self, n):
         """Find the next prime number >= n."""
@@ -267,11 +520,11 @@ class HashTableOpenAddressing:
         attempts = 0
         
         while attempts < self.size:
-            if self.table[index] is None:
+            item = self.table[index]
+            if item is None:
                 return None
-            if self.table[index] != self.DELETED and isinstance(self.table[index], Product):
-                if self.table[index].product_id == product_id:
-                    return self.table[index]
+            if item is not self.DELETED and item.product_id == product_id:
+                return item
             index = (index + 1) % self.size
             attempts += 1
         
@@ -310,18 +563,50 @@ class HashTableOpenAddressing:
         attempts = 0
         
         while attempts < self.size:
-            if self.table[index] is None:
+            item = self.table[index]
+            if item is None:
                 return False
-            if self.table[index] != self.DELETED and isinstance(self.table[index], Product):
-                if self.table[index].product_id == product_id:
-                    self.table[index] = self.DELETED
-                    self.count -= 1
-                    return True
+            if item is not self.DELETED and item.product_id == product_id:
+                self.table[index] = self.DELETED
+                self.count -= 1
+                self.tombstones += 1
+                return True
             index = (index + 1) % self.size
             attempts += 1
         
         return False
     
+    def stats(self):
+        """
+        Snapshot of the table's shape, computed on demand.
+        Chains are clusters: runs of occupied slots, tombstones included.
+        
+        Returns:
+            Dict with the keys of HashTableSeparateChaining.stats()
+        """
+        table, size, deleted = self.table, self.size, self.DELETED
+        probes = ((index - self._hash(item.product_id)) % size + 1
+                  for index, item in enumerate(table) if item is not None and item is not deleted)
+        
+        # Scan from an empty slot so no cluster wraps around the end
+        start = next((index for index, item in enumerate(table) if item is None), 0)
+        clusters = []
+        run = 0
+        for offset in range(size):
+            if table[(start + offset) % size] is None:
+                if run:
+                    clusters.append(run)
+                run = 0
+            else:
+                run += 1
+        if run:
+            clusters.append(run)
+        return _table_stats(self, clusters, probes, self._bytes_used())
+    
+    def _bytes_used(self):
+        """Bytes held by the table structure, excluding the products."""
+        return sys.getsizeof(self.table)
+    
     def get_all_products(self):
         """Get all products from the hash table."""
         products = []
@@ -331,3 +616,305 @@ class HashTableOpenAddressing:
         return products
 
 
+class HashTableRobinHood(HashTableOpenAddressing):
+    """
+    Hash table using Robin Hood linear probing.
+    
+    Each entry records its distance from its home slot. Inserting displaces
+    entries closer to home than the newcomer ("take from the rich"), which
+    keeps probe lengths short and even; lookups stop as soon as they pass
+    an entry closer to home than the key would be. Deletion shifts the
+    following entries back one slot, so there are no tombstones.
+    """
+    
+    MAX_LOAD = 0.85  # Robin Hood stays efficient at higher loads
+    
+    def __init__(self, size=101):
+        """
+        Initialize hash table with Robin Hood probing.
+        
+        Args:
+            size: Initial size of the hash table (should be prime)
+        """
+        super().__init__(size)
+        self.distances = [0] * size  # Probe distance of each occupied slot
+    
+    def insert_product(self, product):
+        """
+        Insert a product into the hash table.
+        
+        Args:
+            product: Product object to insert
+        """
+        table, distances, size = self.table, self.distances, self.size
+        key = product.product_id
+        index = self._hash(key)
+        distance = 0
+        
+        while True:
+            item = table[index]
+            if item is None:
+                table[index] = product
+                distances[index] = distance
+                self.count += 1
+                break
+            if item.product_id == key:
+                table[index] = product  # Update existing
+                return
+            if distances[index] < distance:
+                # The resident is closer to home: it yields the slot and moves on
+                table[index], product = product, item
+                distances[index], distance = distance, distances[index]
+                key = product.product_id
+            index = (index + 1) % size
+            distance += 1
+        
+        # Resize if load factor > MAX_LOAD
+        if self.count > self.size * self.MAX_LOAD:
+            self._resize()
+    
+    def _allocate(self, size):
+        """Replace the table with `size` empty slots."""
+        self.size = size
+        self.table = [None] * size
+        self.distances = [0] * size
+        self.count = 0
+    
+    def _bytes_used(self):
+        """Bytes held by the table structure, excluding the products."""
+        return sys.getsizeof(self.table) + sys.getsizeof(self.distances)
+    
+    @_records_resize
+    def _resize(self):
+        """Resize the hash table when load factor is too high."""
+        old_table = self.table
+        self._allocate(self._next_prime(self.size * 2))
+        
+        # Rehash all elements
+        for item in old_table:
+            if item is not None:
+                self.insert_product(item)
+    
+    def _rebuild(self, size, products):
+        """Refill `size` empty slots with distinct products (see bulk_load)."""
+        self._allocate(size)
+        for product in products:
+            self.insert_product(product)
+    
+    def _find(self, product_id):
+        """Slot index holding a product ID, or None."""
+        table, distances, size = self.table, self.distances, self.size
+        index = self._hash(product_id)
+        distance = 0
+        while True:
+            item = table[index]
+            if item is None or distances[index] < distance:
+                return None  # The key would have been placed before here
+            if item.product_id == product_id:
+                return index
+            index = (index + 1) % size
+            distance += 1
+    
+    def search_product_by_id(self, product_id):
+        """
+        Search for a product by ID.
+        
+        Args:
+            product_id: ID of the product to search
+            
+        Returns:
+            Product object if found, None otherwise
+        """
+        index = self._find(product_id)
+        return None if index is None else self.table[index]
+    
+    def delete_product(self, product_id):
+        """
+        Delete a product from the hash table (backward-shift deletion).
+        
+        Args:
+            product_id: ID of the product to delete
+            
+        Returns:
+            True if deleted, False if not found
+        """
+        index = self._find(product_id)
+        if index is None:
+            return False
+        
+        # Shift the following displaced entries back one slot each
+        table, distances, size = self.table, self.distances, self.size
+        following = (index + 1) % size
+        while table[following] is not None and distances[following] > 0:
+            table[index] = table[following]
+            distances[index] = distances[following] - 1
+            index = following
+            following = (following + 1) % size
+        table[index] = None
+        distances[index] = 0
+        self.count -= 1
+        return True
+
+
+class HashTableFibonacci(HashTableRobinHood):
+    """
+    Robin Hood hash table specialized for integer product IDs.
+    
+    The home slot comes from Fibonacci hashing (multiply by 2**64 / golden
+    ratio and keep the top bits) into a power-of-two table, and keys are
+    kept in a compact array('q') parallel to the product list, so probing
+    compares machine integers instead of dereferencing products.
+    """
+    
+    FIBONACCI = 11400714819323198485  # 2**64 / golden ratio, odd
+    MASK64 = (1 << 64) - 1
+    MIN_KEY = -(1 << 63)  # Keys are stored in an array('q')
+    MAX_KEY = (1 << 63) - 1
+    
+    def __init__(self, size=128):
+        """
+        Initialize hash table with Fibonacci hashing.
+        
+        Args:
+            size: Initial size of the hash table (rounded up to a power of two)
+        """
+        self._allocate(1 << max(1, (size - 1).bit_length()))
+        self.tombstones = 0
+        self.DELETED = object()
+        self.resize_stats = None
+    
+    def _allocate(self, size):
+        """Replace the table with `size` (a power of two) empty slots."""
+        self.size = size
+        self.shift = 64 - (size.bit_length() - 1)
+        self.keys = array('q', bytes(8 * size))
+        self.table = [None] * size  # Products; None marks an empty slot
+        self.distances = array('i', bytes(4 * size))
+        self.count = 0
+    
+    def _capacity(self, count):
+        """Smallest power-of-two size holding `count` entries within MAX_LOAD."""
+        size = 2
+        while count > size * self.MAX_LOAD:
+            size *= 2
+        return size
+    
+    def _bytes_used(self):
+        """Bytes held by the table structure, excluding the products."""
+        return sys.getsizeof(self.table) + sys.getsizeof(self.distances) + sys.getsizeof(self.keys)
+    
+    def check_key(self, key):
+        """
+        Check that a product ID is an integer in the signed 64-bit range.
+        
+        Raises:
+            TypeError: If the key is not an integer
+            ValueError: If the key is outside the signed 64-bit range
+        """
+        self._hash(key)
+    
+    def _hash(self, key):
+        """
+        Fibonacci hash of an integer key: the top bits of key * 2**64/phi.
+        
+        Raises:
+            TypeError: If the key is not an integer
+            ValueError: If the key is outside the signed 64-bit range
+        """
+        if not isinstance(key, int):
+            raise TypeError(f"Product ID must be an integer, got {type(key).__name__}")
+        if not self.MIN_KEY <= key <= self.MAX_KEY:
+            raise ValueError(f"Product ID {key} is outside the signed 64-bit range")
+        return ((key * self.FIBONACCI) & self.MASK64) >> self.shift
+    
+    def insert_product(self, product):
+        """
+        Insert a product into the hash table.
+        
+        Args:
+            product: Product object to insert (with an integer ID)
+        """
+        keys, table, distances = self.keys, self.table, self.distances
+        mask = self.size - 1
+        key = product.product_id
+        index = self._hash(key)
+        distance = 0
+        
+        while True:
+            if table[index] is None:
+                keys[index] = key
+                table[index] = product
+                distances[index] = distance
+                self.count += 1
+                break
+            if keys[index] == key:
+                table[index] = product  # Update existing
+                return
+            if distances[index] < distance:
+                # The resident is closer to home: it yields the slot and moves on
+                keys[index], key = key, keys[index]
+                table[index], product = product, table[index]
+                distances[index], distance = distance, distances[index]
+            index = (index + 1) & mask
+            distance += 1
+        
+        # Resize if load factor > MAX_LOAD
+        if self.count > self.size * self.MAX_LOAD:
+            self._resize()
+    
+    @_records_resize
+    def _resize(self):
+        """Double the table size when the load factor is too high."""
+        old_table = self.table
+        self._allocate(self.size * 2)
+        
+        # Rehash all elements
+        for item in old_table:
+            if item is not None:
+                self.insert_product(item)
+    
+    def _find(self, product_id):
+        """Slot index holding a product ID, or None."""
+        if not isinstance(product_id, int):
+            return None
+        keys, table, distances = self.keys, self.table, self.distances
+        mask = self.size - 1
+        index = ((product_id * self.FIBONACCI) & self.MASK64) >> self.shift  # Inlined _hash()
+        distance = 0
+        while True:
+            if table[index] is None or distances[index] < distance:
+                return None  # The key would have been placed before here
+            if keys[index] == product_id:
+                return index
+            index = (index + 1) & mask
+            distance += 1
+    
+    def delete_product(self, product_id):
+        """
+        Delete a product from the hash table (backward-shift deletion).
+        
+        Args:
+            product_id: ID of the product to delete
+            
+        Returns:
+            True if deleted, False if not found
+        """
+        index = self._find(product_id)
+        if index is None:
+            return False
+        
+        # Shift the following displaced entries back one slot each
+        keys, table, distances = self.keys, self.table, self.distances
+        mask = self.size - 1
+        following = (index + 1) & mask
+        while table[following] is not None and distances[following] > 0:
+            keys[index] = keys[following]
+            table[index] = table[following]
+            distances[index] = distances[following] - 1
+            index = following
+            following = (following + 1) & mask
+        keys[index] = 0
+        table[index] = None
+        distances[index] = 0
+        self.count -= 1
+        return True
@@ -0,0 +1,125 @@
+"""
+MinHash locality-sensitive hashing for approximate keyword-set neighbors.
+"""
+
+import random
+from collections import Counter
+from itertools import chain, islice
+
+
+class MinHashLSH:
+    """
+    Banded MinHash index over token-ID sets, partitioned by group.
+
+    Each item's token set is summarized by `num_perm` minimum hash values,
+    split into `bands` bands; items whose band values agree in at least one
+    band (within the same group) are candidate neighbors. With short
+    product names, narrow bands keep recall high for modest overlaps.
+    """
+
+    PRIME = (1 << 61) - 1  # Mersenne prime modulus of the hash family
+
+    def __init__(self, num_perm=32, bands=32, seed=0):
+        """
+        Initialize an empty index.
+
+        Args:
+            num_perm: Number of hash functions in a signature
+            bands: Number of bands (must divide num_perm)
+            seed: Seed of the hash functions
+        """
+        if num_perm % bands:
+            raise ValueError("bands must divide num_perm")
+        rng = random.Random(seed)
+        self.hashes = [(rng.randrange(1, self.PRIME), rng.randrange(self.PRIME)) for _ in range(num_perm)]
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.buckets = {}  # (group, band, band values) -> {item ID: None} (insertion ordered)
+        self.items = {}  # item ID -> list of bucket keys
+
+    def signature(self, tokens):
+        """
+        MinHash signature of a token set.
+
+        Args:
+            tokens: Iterable of integer token IDs
+
+        Returns:
+            Tuple of num_perm minimum hash values, or None for an empty set
+        """
+        tokens = list(tokens)
+        if not tokens:
+            return None
+        prime = self.PRIME
+        return tuple(min((a * t + b) % prime for t in tokens) for a, b in self.hashes)
+
+    def _bucket_keys(self, group, signature):
+        """Bucket keys of a signature's bands within a group."""
+        rows = self.rows
+        return [(group, band, signature[band * rows:(band + 1) * rows]) for band in range(self.bands)]
+
+    def add(self, item_id, group, tokens):
+        """
+        Index an item, replacing any previous entry for it.
+
+        Args:
+            item_id: Hashable item ID
+            group: Partition the item belongs to (only queried groups match)
+            tokens: Iterable of integer token IDs
+        """
+        self.remove(item_id)
+        signature = self.signature(tokens)
+        if signature is None:
+            return
+        keys = self._bucket_keys(group, signature)
+        for key in keys:
+            self.buckets.setdefault(key, {})[item_id] = None
+        self.items[item_id] = keys
+
+    def remove(self, item_id):
+        """
+        Remove an item from the index.
+
+        Args:
+            item_id: ID of the item to remove
+
+        Returns:
+            True if removed, False if not present
+        """
+        keys = self.items.pop(item_id, None)
+        if keys is None:
+            return False
+        for key in keys:
+            bucket = self.buckets[key]
+            del bucket[item_id]
+            if not bucket:
+                del self.buckets[key]
+        return True
+
+    def query(self, groups, tokens, per_bucket=None, signature=None):
+        """
+        Find items sharing at least one band with a token set.
+
+        Args:
+            groups: Groups to search
+            tokens: Iterable of integer token IDs of the query
+            per_bucket: Maximum items taken from each bucket (oldest first),
+                bounding the cost of very common bands
+            signature: signature(tokens), if already computed
+
+        Returns:
+            List of item IDs, most colliding bands first
+        """
+        if signature is None:
+            signature = self.signature(tokens)
+        if signature is None:
+            return []
+        rows = self.rows
+        bands = [(band, signature[band * rows:(band + 1) * rows]) for band in range(self.bands)]
+        buckets = self.buckets
+        matched = (buckets.get((group, band, values)) for group in groups for band, values in bands)
+        hits = Counter(chain.from_iterable(islice(bucket, per_bucket) for bucket in matched if bucket))
+        return [item_id for item_id, _ in hits.most_common()]
+
+    def __len__(self):
+        return len(self.items)
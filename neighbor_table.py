@@ -0,0 +1,236 @@
+"""
+Materialized nearest-neighbor lists for recommendations.
+"""
+
+from bisect import bisect_left, bisect_right, insort
+
+
+class NeighborTable:
+    """
+    The top scored neighbors of each product, kept in rank order.
+
+    A row holds parallel lists of keys (-similarity, sequence) and
+    (neighbor, similarity) entries, best first. Its first `prefix` entries
+    are an exact prefix of the product's ranking; the rest are the best
+    neighbors of each group (see `group`) that are missing from the prefix,
+    so diversification caps can be met from the row alone.
+    Prefixes hold up to `capacity` neighbors and groups up to `head_capacity`
+    so a few deletions can be absorbed; a row whose prefix drops below
+    `count` neighbors without holding every other product is discarded, and
+    one short of a group's `heads` fails lists_heads(), to be rebuilt by
+    the owner.
+    """
+
+    def __init__(self, count, capacity=None, heads=0, head_capacity=None, group=None):
+        """
+        Initialize an empty neighbor table.
+
+        Args:
+            count: Number of prefix neighbors a row must keep to stay valid
+            capacity: Maximum prefix neighbors per row (default count * 1.5)
+            heads: Number of best neighbors per group a row must list to stay valid
+            head_capacity: Best neighbors listed per group (default heads * 2)
+            group: Function mapping a neighbor to its group key (used with heads)
+        """
+        self.count = count
+        self.capacity = capacity or count + count // 2
+        self.heads = heads
+        self.head_capacity = head_capacity or heads * 2
+        self.group = group
+        # product ID -> [keys, entries, complete, prefix, group -> keys, short groups]
+        self.rows = {}
+        self.referrers = {}  # neighbor product ID -> IDs of the rows listing it
+
+    def set_row(self, product_id, keys, entries, total, prefix=None):
+        """
+        Store a product's neighbors, replacing any existing row.
+
+        Args:
+            product_id: ID of the product the row belongs to
+            keys: Sort keys of the neighbors, ascending
+            entries: List of (neighbor, similarity), best first
+            total: Number of other products in the catalog
+            prefix: Number of leading entries that are the top of the ranking;
+                the rest must be the best `head_capacity` of their group
+                (default: all entries, up to capacity)
+        """
+        self.remove_row(product_id)
+        if prefix is None:
+            keys, entries = keys[:self.capacity], entries[:self.capacity]
+            prefix = len(entries)
+        keys = list(keys)
+        entries = list(entries)
+        groups = {}
+        if self.heads:
+            for key, (neighbor, _) in zip(keys, entries):
+                groups.setdefault(self.group(neighbor), []).append(key)
+        self.rows[product_id] = [keys, entries, prefix >= total, prefix, groups, set()]
+        for neighbor, _ in entries:
+            self.referrers.setdefault(neighbor.product_id, set()).add(product_id)
+
+    def get(self, product_id):
+        """
+        Get a product's neighbors.
+
+        Args:
+            product_id: ID of the product
+
+        Returns:
+            Tuple (list of (neighbor, similarity), True if the row holds every
+            other product), or None if the product has no row
+        """
+        row = self.rows.get(product_id)
+        if row is None:
+            return None
+        return row[1], row[2]
+
+    def offer(self, product_id, key, neighbor, similarity):
+        """
+        Splice a new neighbor into a product's row if it ranks high enough,
+        in the prefix or among its group's best.
+
+        Args:
+            product_id: ID of the product whose row to update
+            key: Sort key (-similarity, sequence) of the neighbor
+            neighbor: Neighbor product
+            similarity: Similarity of the neighbor to the product
+
+        Returns:
+            True if the neighbor was inserted (False if it is already listed)
+        """
+        row = self.rows.get(product_id)
+        if row is None or product_id in self.referrers.get(neighbor.product_id, ()):
+            return False
+        keys, entries, complete, prefix, groups, short = row
+        index = bisect_right(keys, key)
+        group = self.group(neighbor) if self.heads else None
+        if index < prefix or complete:
+            prefix += 1
+        elif not self.heads:
+            # Past the end of a truncated prefix, where its rank is unknown
+            return False
+        else:
+            # Behind its group's listed neighbors, the rank is known only in a
+            # group that has never lost one of its best
+            members = groups.get(group, ())
+            rank = bisect_right(members, key)
+            if rank >= (len(members) if group in short else self.head_capacity):
+                return False
+        keys.insert(index, key)
+        entries.insert(index, (neighbor, similarity))
+        if self.heads:
+            insort(groups.setdefault(group, []), key)
+        self.referrers.setdefault(neighbor.product_id, set()).add(product_id)
+        if prefix > self.capacity:
+            # The last prefix neighbor falls out: the prefix no longer holds everything
+            prefix = self.capacity
+            row[2] = False
+            self._trim(product_id, row, prefix, prefix)
+        row[3] = prefix
+        if self.heads:
+            # The group's former last listed neighbor is surplus unless in the prefix
+            members = groups[group]
+            if len(members) > self.head_capacity:
+                self._trim(product_id, row, bisect_left(keys, members[self.head_capacity]), prefix)
+        return True
+
+    def _trim(self, product_id, row, index, prefix):
+        """Drop the entry at `index` if it is past the prefix and its group's best."""
+        keys, entries, _, _, groups, _ = row
+        if index < prefix or index >= len(entries):
+            return
+        neighbor = entries[index][0]
+        if self.heads:
+            members = groups[self.group(neighbor)]
+            if bisect_left(members, keys[index]) < self.head_capacity:
+                return
+            members.remove(keys[index])
+        del keys[index]
+        del entries[index]
+        self._unrefer(neighbor.product_id, product_id)
+
+    def discard(self, product_id):
+        """
+        Remove a product from the table: its own row and every row listing it.
+        Rows whose prefix falls below `count` neighbors are dropped for
+        rebuilding.
+
+        Args:
+            product_id: ID of the removed product
+
+        Returns:
+            IDs of the rows that were dropped
+        """
+        self.remove_row(product_id)
+        dropped = []
+        for referrer in self.referrers.pop(product_id, ()):
+            row = self.rows[referrer]
+            keys, entries, complete, _, groups, short = row
+            for index, (neighbor, _) in enumerate(entries):
+                if neighbor.product_id == product_id:
+                    if self.heads:
+                        group = self.group(neighbor)
+                        members = groups[group]
+                        members.remove(keys[index])
+                        if len(members) == self.head_capacity - 1 and not complete:
+                            # The group's next best neighbor is now unknown
+                            short.add(group)
+                        if not members:
+                            del groups[group]
+                    del keys[index]
+                    del entries[index]
+                    if index < row[3]:
+                        row[3] -= 1
+                    break
+            if row[3] < self.count and not complete:
+                self.remove_row(referrer)
+                dropped.append(referrer)
+        return dropped
+
+    def lists_heads(self, product_id, group_sizes, own_group=None):
+        """
+        Check a product's row lists the best `heads` neighbors of every group.
+
+        Args:
+            product_id: ID of the product whose row to check
+            group_sizes: Dictionary of group key -> number of catalog products
+            own_group: Group of the product itself, which is not its own neighbor
+
+        Returns:
+            True if every group lists min(heads, other products in it) neighbors
+        """
+        row = self.rows.get(product_id)
+        if row is None:
+            return False
+        if row[2] or not self.heads:
+            return True
+        groups = row[4]
+        for group, size in group_sizes.items():
+            if group == own_group:
+                size -= 1
+            if len(groups.get(group, ())) < min(self.heads, size):
+                return False
+        return True
+
+    def remove_row(self, product_id):
+        """Drop a product's row, if any."""
+        row = self.rows.pop(product_id, None)
+        if row is not None:
+            for neighbor, _ in row[1]:
+                self._unrefer(neighbor.product_id, product_id)
+
+    def _unrefer(self, neighbor_id, product_id):
+        """Remove one reverse-index link."""
+        referrers = self.referrers.get(neighbor_id)
+        if referrers is not None:
+            referrers.discard(product_id)
+            if not referrers:
+                del self.referrers[neighbor_id]
+
+    def clear(self):
+        """Drop every row."""
+        self.rows = {}
+        self.referrers = {}
+
+    def __len__(self):
+        return len(self.rows)
@@ -0,0 +1,119 @@
+"""
+Character n-gram inverted index for substring product-name search.
+"""
+
+
+class NGramIndex:
+    """Inverted index mapping character n-grams of product names to product IDs."""
+
+    def __init__(self, n=3):
+        """
+        Initialize the n-gram index.
+
+        Args:
+            n: Length of the character n-grams (3 = trigrams)
+        """
+        self.n = n
+        self.postings = {}  # n-gram -> set of product IDs
+        self.products = {}  # product ID -> product (insertion ordered)
+        self.names = {}  # product ID -> lowercased name
+        self.sequence = {}  # product ID -> insertion sequence number
+        self._next_sequence = 0
+
+    def _grams(self, text):
+        """Get the set of distinct n-grams in a lowercased string."""
+        n = self.n
+        return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+    def add(self, product):
+        """
+        Index a product by the n-grams of its name.
+        A product replacing one with the same ID keeps its place in
+        insertion order.
+
+        Args:
+            product: Product object to index
+        """
+        product_id = product.product_id
+        name_lower = product.name.lower()
+        old_name = self.names.get(product_id)
+        if old_name is not None:
+            self._discard_postings(product_id, old_name)
+        else:
+            self.sequence[product_id] = self._next_sequence
+            self._next_sequence += 1
+        self.products[product_id] = product
+        self.names[product_id] = name_lower
+
+        for gram in self._grams(name_lower):
+            posting = self.postings.get(gram)
+            if posting is None:
+                self.postings[gram] = {product_id}
+            else:
+                posting.add(product_id)
+
+    def remove(self, product_id):
+        """
+        Remove a product from the index.
+
+        Args:
+            product_id: ID of the product to remove
+
+        Returns:
+            True if removed, False if not indexed
+        """
+        name_lower = self.names.pop(product_id, None)
+        if name_lower is None:
+            return False
+        del self.products[product_id]
+        del self.sequence[product_id]
+        self._discard_postings(product_id, name_lower)
+        return True
+
+    def _discard_postings(self, product_id, name_lower):
+        """Drop a product ID from the postings of its indexed name's n-grams."""
+        for gram in self._grams(name_lower):
+            posting = self.postings[gram]
+            posting.discard(product_id)
+            if not posting:
+                del self.postings[gram]
+
+    def search(self, name):
+        """
+        Find products whose name contains the query (case-insensitive).
+
+        Intersects the posting lists of the query's n-grams, smallest first,
+        and verifies the surviving candidates with a substring test.
+        Queries shorter than n fall back to a scan of the cached lowercase names.
+
+        Args:
+            name: Name or partial name to search
+
+        Returns:
+            List of matching products in catalog insertion order
+        """
+        name_lower = name.lower()
+
+        if len(name_lower) < self.n:
+            return [self.products[pid] for pid, indexed_name in self.names.items()
+                    if name_lower in indexed_name]
+
+        postings = []
+        for gram in self._grams(name_lower):
+            posting = self.postings.get(gram)
+            if not posting:
+                return []
+            postings.append(posting)
+        postings.sort(key=len)
+
+        candidates = postings[0]
+        for posting in postings[1:]:
+            candidates = candidates & posting
+            if not candidates:
+                return []
+
+        ids = sorted(candidates, key=self.sequence.__getitem__)
+        return [self.products[pid] for pid in ids if name_lower in self.names[pid]]
+
+    def __len__(self):
+        return len(self.products)
@@ -0,0 +1,213 @@
+"""
+Minimal perfect hashing (CHD-style hash and displace) for frozen catalogs.
+"""
+
+import sys
+from array import array
+from collections import Counter
+
+
+class MinimalPerfectHash:
+    """
+    Maps a fixed set of n integer keys one-to-one onto 0..n-1.
+
+    Keys are split into buckets by one hash; each bucket stores a
+    displacement d, chosen at build time so that a second hash seeded with
+    d sends every key of the bucket to a free slot. Single-key buckets
+    store their slot directly (as -slot - 1). A lookup is two multiplies
+    and one key comparison over flat arrays.
+    """
+
+    MULTIPLIER = 0x9E3779B97F4A7C15  # 2**64 / golden ratio
+    SEED_MULTIPLIER = 0xBF58476D1CE4E5B9
+    MASK64 = (1 << 64) - 1
+    MIN_KEY = -(1 << 63)  # Keys are stored in an array('q')
+    MAX_KEY = (1 << 63) - 1
+    BUCKET_SIZE = 1  # Average keys per bucket; larger packs tighter but builds slower
+
+    def __init__(self, keys):
+        """
+        Build the hash for a set of distinct integer keys.
+
+        Args:
+            keys: Iterable of distinct integers (64-bit signed range)
+
+        Raises:
+            TypeError: If a key is not an integer (bool included)
+            ValueError: If a key is repeated or outside the signed 64-bit range
+        """
+        keys = list(keys)
+        for key in keys:
+            if not isinstance(key, int) or isinstance(key, bool):
+                raise TypeError(f"Keys must be integers, got {type(key).__name__}")
+            if not self.MIN_KEY <= key <= self.MAX_KEY:
+                raise ValueError(f"Key {key} is outside the signed 64-bit range")
+        n = len(keys)
+        if len(set(keys)) != n:
+            raise ValueError("Keys must be distinct")
+        self.size = n
+        bits = max(1, (max(n // self.BUCKET_SIZE, 1) - 1).bit_length())
+        self.bucket_shift = 64 - bits
+        self.displacements = array('i', bytes(4 << bits))
+
+        buckets = [[] for _ in range(1 << bits)]
+        for key in keys:
+            buckets[self._bucket(key)].append(key)
+        buckets.sort(key=len, reverse=True)
+
+        slots = array('q', bytes(8 * n))  # Key stored in each slot
+        taken = bytearray(n)
+        index = 0
+        while index < len(buckets) and len(buckets[index]) > 1:
+            bucket = buckets[index]
+            displacement = 0
+            while True:
+                placed = [self._slot(key, displacement) for key in bucket]
+                if len(set(placed)) == len(placed) and not any(taken[slot] for slot in placed):
+                    break
+                displacement += 1
+            self.displacements[self._bucket(bucket[0])] = displacement
+            for key, slot in zip(bucket, placed):
+                taken[slot] = 1
+                slots[slot] = key
+            index += 1
+
+        # Single-key buckets take the remaining free slots directly
+        free = (slot for slot in range(n) if not taken[slot])
+        for bucket in buckets[index:]:
+            if not bucket:
+                break
+            slot = next(free)
+            self.displacements[self._bucket(bucket[0])] = -slot - 1
+            slots[slot] = bucket[0]
+        self.keys = slots
+
+    def _bucket(self, key):
+        """First-level hash: the key's bucket."""
+        return ((key * self.MULTIPLIER) & self.MASK64) >> self.bucket_shift
+
+    def _slot(self, key, displacement):
+        """Second-level hash: the key's slot for a displacement."""
+        mixed = ((key ^ (displacement * self.SEED_MULTIPLIER)) * self.MULTIPLIER) & self.MASK64
+        return (mixed * self.size) >> 64
+
+    def index(self, key):
+        """
+        Slot of a key.
+
+        Args:
+            key: Key to look up
+
+        Returns:
+            Index in 0..n-1, or None if the key is not in the set
+        """
+        if not isinstance(key, int) or isinstance(key, bool) or not self.size:
+            return None
+        displacement = self.displacements[((key * self.MULTIPLIER) & self.MASK64) >> self.bucket_shift]
+        if displacement < 0:
+            slot = -displacement - 1
+        else:
+            mixed = ((key ^ (displacement * self.SEED_MULTIPLIER)) * self.MULTIPLIER) & self.MASK64
+            slot = (mixed * self.size) >> 64
+        return slot if self.keys[slot] == key else None
+
+    def __len__(self):
+        return self.size
+
+
+class FrozenHashTable:
+    """
+    Read-only product table addressed by a minimal perfect hash of the IDs.
+
+    Offers the lookup interface of the other hash tables; insert and delete
+    raise RuntimeError.
+    """
+
+    def __init__(self, products):
+        """
+        Build the table.
+
+        Args:
+            products: Products with distinct integer IDs
+
+        Raises:
+            TypeError: If a product ID is not an integer
+            ValueError: If IDs repeat or fall outside the signed 64-bit range
+        """
+        products = list(products)
+        self.hash = MinimalPerfectHash(p.product_id for p in products)
+        self.table = [None] * len(products)
+        for product in products:
+            self.table[self.hash.index(product.product_id)] = product
+        self.size = self.count = len(products)
+
+    def search_product_by_id(self, product_id):
+        """
+        Search for a product by ID.
+
+        Args:
+            product_id: ID of the product to search
+
+        Returns:
+            Product object if found, None otherwise
+        """
+        slot = self.hash.index(product_id)
+        return None if slot is None else self.table[slot]
+
+    def search_product_by_name(self, name):
+        """
+        Search for products by name (partial match).
+
+        Args:
+            name: Name or partial name to search
+
+        Returns:
+            List of matching products
+        """
+        name_lower = name.lower()
+        return [p for p in self.table if name_lower in p.name.lower()]
+
+    def insert_product(self, product):
+        """Frozen tables cannot be modified."""
+        raise RuntimeError("Hash table is frozen")
+
+    def delete_product(self, product_id):
+        """Frozen tables cannot be modified."""
+        raise RuntimeError("Hash table is frozen")
+
+    def get_all_products(self):
+        """Get all products from the hash table."""
+        return list(self.table)
+
+    def stats(self):
+        """
+        Snapshot of the table's shape, with the keys of the other hash
+        tables' stats(). Chains are the perfect hash's buckets; every
+        lookup takes one probe and the table never resizes.
+
+        Returns:
+            Dict of table statistics
+        """
+        mph = self.hash
+        buckets = Counter(mph._bucket(key) for key in mph.keys)
+        chain_histogram = [len(mph.displacements) - len(buckets)] + [0] * max(buckets.values(), default=0)
+        for length in buckets.values():
+            chain_histogram[length] += 1
+        return {
+            'type': type(self).__name__,
+            'size': self.size,
+            'count': self.count,
+            'load_factor': 1.0 if self.size else 0.0,
+            'tombstones': 0,
+            'chain_histogram': chain_histogram,
+            'max_chain': len(chain_histogram) - 1,
+            'probe_histogram': [0, self.count] if self.count else [],
+            'max_probe': 1 if self.count else 0,
+            'average_probe': 1.0 if self.count else 0.0,
+            'bytes': sys.getsizeof(self.table) + sys.getsizeof(mph.keys) + sys.getsizeof(mph.displacements),
+            'resize_count': 0,
+            'resize_seconds': 0.0,
+            'rehash_count': 0,
+            'rehash_seconds': 0.0,
+            'recent_resizes': [],
+        }
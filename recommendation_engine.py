@@ -3,10 +3,63 @@ Recommendation Engine for product recommendations based on similarity.
 """
 
 from product import Product
+from feature_matrix import FeatureMatrix, np
+from neighbor_table import NeighborTable
+from lsh_index import MinHashLSH
+from sorted_index import SortedIndex
+from bisect import bisect_left, bisect_right
+from collections import deque
+from itertools import islice
+from concurrent.futures import ProcessPoolExecutor
+import heapq
 import math
+import os
 import re
 
 
+WORD_PATTERN = re.compile(r'\b\w+\b')
+
+
+def _rating_block_key(product):
+    """Sort key of the per-block rating indexes."""
+    return (product.rating, product.product_id)
+
+
+# Per-process state of build_all() workers
+_worker_features = None
+_worker_popularity_range = None
+
+
+def _init_worker(snapshot, popularity_range):
+    """Load the shared feature snapshot into a build_all() worker process."""
+    global _worker_features, _worker_popularity_range
+    _worker_features = FeatureMatrix.from_snapshot(snapshot)
+    _worker_popularity_range = popularity_range
+
+
+def _score_block(block, count, per_group):
+    """
+    Score a block of target rows against the whole snapshot.
+    
+    Args:
+        block: (start, end) range of target rows
+        count: Neighbors to keep per target
+        per_group: Best neighbors also kept per (category, price tier) group
+        
+    Returns:
+        List of (row, neighbor rows, similarities, neighbor sequences), best first
+    """
+    fm = _worker_features
+    results = []
+    for row in range(*block):
+        scores = fm.similarities(fm.category_matrix[fm.category_codes[row]], fm.row_tokens[row],
+                                 fm.tiers[row], fm.ratings[row], fm.popularity[row],
+                                 _worker_popularity_range)
+        top_rows, _ = fm.top_rows(scores, count, exclude=row, per_group=per_group)
+        results.append((row, top_rows.astype(np.int32), scores[top_rows], fm.sequence[top_rows]))
+    return results
+
+
 class RecommendationEngine:
     """Engine for generating product recommendations."""
     
@@ -24,28 +77,301 @@ class RecommendationEngine:
         'Networking': ['Accessories', 'Cables'],
     }
     
-    def __init__(self, search_engine):
+    # Price tiers and their lower bounds (tier i covers [bound i-1, bound i))
+    PRICE_TIERS = ['budget', 'low', 'mid-low', 'mid', 'mid-high', 'high', 'premium']
+    PRICE_TIER_BOUNDS = [20, 50, 100, 300, 800, 1500]
+    
+    # Approximate candidates per request, at least this multiple of the requested limit
+    CANDIDATE_POOL_FACTOR = 4
+    
+    # Neighbors materialized per product (the candidate pool of the default limit)
+    NEIGHBOR_COUNT = 48
+    
+    # Approximate candidates (MinHash LSH plus rating-nearest products)
+    # re-ranked when get_recommendations(approximate=True) is requested
+    APPROXIMATE_CANDIDATES = 300
+    
+    # Diversification defaults: caps per category / price tier, and the score
+    # penalty per already-selected product sharing the category or tier
+    MAX_PER_CATEGORY = 3
+    MAX_PER_TIER = 2
+    DIVERSITY_PENALTY = 0.05
+    
+    # Common words ignored when matching names
+    STOP_WORDS = frozenset({'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of', 'with', 'by'})
+    
+    def __init__(self, search_engine, max_per_category=None, max_per_tier=None, diversity_penalty=None):
         """
         Initialize recommendation engine.
         
         Args:
             search_engine: SearchEngine instance with product catalog
+            max_per_category: Cap on recommendations sharing a category (default MAX_PER_CATEGORY)
+            max_per_tier: Cap on recommendations sharing a price tier (default MAX_PER_TIER)
+            diversity_penalty: Score penalty per selected product sharing the
+                category or tier (default DIVERSITY_PENALTY)
         """
         self.search_engine = search_engine
+        self.max_per_category = self.MAX_PER_CATEGORY if max_per_category is None else max_per_category
+        self.max_per_tier = self.MAX_PER_TIER if max_per_tier is None else max_per_tier
+        self.diversity_penalty = self.DIVERSITY_PENALTY if diversity_penalty is None else diversity_penalty
+        
+        # Keyword tokens and price tier per product, computed once at insert time
+        self.token_ids = {}  # keyword -> interned token ID
+        self.product_tokens = {}  # product ID -> (product, frozenset of token IDs)
+        self.product_tiers = {}  # product ID -> price tier index
+        
+        # Feature columns for vectorized scoring (None without NumPy)
+        self.features = None
+        if np is not None:
+            tier_prices = [0] + self.PRICE_TIER_BOUNDS
+            tier_scores = [[self.price_tier_similarity(a, b) for b in tier_prices] for a in tier_prices]
+            self.features = FeatureMatrix(self.category_relationship_score, tier_scores)
+        
+        # Top neighbors per product plus the heads of every (category, tier)
+        # group, built lazily or by build_neighbors(). Scores depend on the
+        # catalog's popularity range, so rows are dropped when it changes and
+        # rebuilt one at a time as they are read.
+        self.neighbors = NeighborTable(self.NEIGHBOR_COUNT, heads=min(self.max_per_category, self.max_per_tier),
+                                       group=lambda p: (p.category, self.price_tier_index(p.price)))
+        self.neighbor_range = None
+        self.group_sizes = {}  # (category, tier) -> number of products
+        
+        # Approximate candidate generation: keyword LSH and rating order per
+        # (category, price tier) block, built by the first approximate query
+        self.lsh = None
+        self.rating_blocks = None  # (category, tier) -> SortedIndex by (rating, ID)
+        
+        # Products per case-folded category, best rated first (ties in catalog order)
+        sequence = search_engine.sequence
+        self.rating_key = lambda p: (-p.rating, sequence[p.product_id])
+        self.category_index = {}  # category.casefold() -> SortedIndex
+        
+        search_engine.subscribe(self)
+        for product in search_engine.get_all_products():
+            self.on_product_added(product)
+    
+    def on_product_added(self, product):
+        """Tokenize a product added to the catalog (SearchEngine listener)."""
+        self._index_product(product)
+        if self._sync_neighbor_range():
+            self._splice_neighbor(product)
+    
+    def on_products_added(self, products):
+        """
+        Tokenize a batch of added products (SearchEngine listener).
+        Splicing costs one catalog scoring pass per new product, so a batch
+        at least as large as the neighbor table drops the rows once instead;
+        they are rebuilt on demand.
+        """
+        if len(products) >= len(self.neighbors):
+            self.neighbors.clear()
+        for product in products:
+            self._index_product(product)
+        if self._sync_neighbor_range():
+            for product in products:
+                self._splice_neighbor(product)
+    
+    def _index_product(self, product):
+        """Add a product's tokens, features and index entries."""
+        tokens = self._tokenize(product.name)
+        tier = self.price_tier_index(product.price)
+        self.product_tokens[product.product_id] = (product, tokens)
+        self.product_tiers[product.product_id] = tier
+        self.group_sizes[(product.category, tier)] = self.group_sizes.get((product.category, tier), 0) + 1
+        if self.features is not None:
+            sequence = self.search_engine.sequence.get(product.product_id, 0)
+            self.features.add(product, tier, tokens, sequence)
+        if self.lsh is not None:
+            self._add_approximate(product, tier, tokens)
+        category = product.category.casefold()
+        ranked = self.category_index.get(category)
+        if ranked is None:
+            ranked = self.category_index[category] = SortedIndex(key=self.rating_key)
+        ranked.insert(product)
+    
+    def _splice_neighbor(self, product):
+        """Score a new product against every neighbor row and splice it in where it ranks."""
+        if self.neighbors.rows:
+            sequence = self.search_engine.sequence.get(product.product_id, 0)
+            if self.features is not None:
+                scores = self.score_all(product)
+                row_of = self.features.row_of
+                similarities = ((pid, float(scores[row_of[pid]])) for pid in list(self.neighbors.rows))
+            else:
+                search_by_id = self.search_engine.search_by_id
+                similarities = ((pid, self.calculate_similarity(search_by_id(pid), product))
+                                for pid in list(self.neighbors.rows))
+            for pid, similarity in similarities:
+                if pid != product.product_id:
+                    self.neighbors.offer(pid, (-similarity, sequence), product, similarity)
+    
+    def on_product_removed(self, product):
+        """Drop cached data for a product removed from the catalog (SearchEngine listener)."""
+        entry = self.product_tokens.pop(product.product_id, None)
+        tier = self.product_tiers.pop(product.product_id, None)
+        if tier is not None:
+            group = (product.category, tier)
+            self.group_sizes[group] -= 1
+            if not self.group_sizes[group]:
+                del self.group_sizes[group]
+        if self.features is not None:
+            self.features.remove(product.product_id, entry[1] if entry else None)
+        if self.lsh is not None:
+            self.lsh.remove(product.product_id)
+            block = self.rating_blocks.get((product.category, tier))
+            if block is not None:
+                block.remove(product)
+                if not len(block):
+                    del self.rating_blocks[(product.category, tier)]
+        category = product.category.casefold()
+        ranked = self.category_index.get(category)
+        if ranked is not None:
+            ranked.remove(product)
+            if not len(ranked):
+                del self.category_index[category]
+        self.neighbors.discard(product.product_id)
+        self._sync_neighbor_range()
+    
+    def _sync_neighbor_range(self):
+        """
+        Keep the neighbor table on the catalog's popularity range.
+        Every score depends on the range, so when it changes all rows are
+        dropped; get_neighbors() rebuilds each one when it is next read,
+        keeping catalog writes free of catalog-wide rankings.
+        
+        Returns:
+            True if the range was unchanged, False if the rows were dropped
+        """
+        popularity_range = self._popularity_range()
+        if popularity_range == self.neighbor_range:
+            return True
+        self.neighbor_range = popularity_range
+        self.neighbors.clear()
+        return False
+    
+    def _build_neighbor_row(self, product):
+        """Rank the catalog for a product and store its top neighbors and group heads."""
+        capacity = self.neighbors.capacity
+        top, total, _ = self._top_candidates(product, capacity, per_group=self.neighbors.head_capacity)
+        sequence = self.search_engine.sequence
+        keys = [(-similarity, sequence.get(p.product_id, 0)) for p, similarity in top]
+        self.neighbors.set_row(product.product_id, keys, top, total, prefix=min(capacity, total))
+        return self.neighbors.get(product.product_id)
+    
+    def build_neighbors(self):
+        """
+        Build the neighbor table for the whole catalog in one batch.
+        Afterwards rows are kept up to date on catalog changes, so
+        recommendations are served by lookup.
+        
+        Returns:
+            Number of rows built
+        """
+        self.neighbor_range = self._popularity_range()
+        for product in self.search_engine.get_all_products():
+            self._build_neighbor_row(product)
+        return len(self.neighbors)
+    
+    def build_all(self, workers=None, block_size=None):
+        """
+        Build the neighbor table for the whole catalog on several processes.
+        Target products are split into blocks scored by a process pool; each
+        worker starts from one compact snapshot of the feature columns and
+        returns the top neighbors of its block, which are merged into the
+        table. Results are identical to build_neighbors().
+        
+        Args:
+            workers: Number of worker processes (default: CPU count);
+                1, or a catalog without NumPy features, builds in-process
+            block_size: Target products per task (default: about four
+                tasks per worker)
+            
+        Returns:
+            Number of rows built
+        """
+        workers = workers or os.cpu_count() or 1
+        fm = self.features
+        if workers <= 1 or fm is None or fm.size < 2:
+            return self.build_neighbors()
+        
+        self.neighbor_range = self._popularity_range()
+        n = fm.size
+        block_size = block_size or max(1, -(-n // (workers * 4)))
+        blocks = [(start, min(start + block_size, n)) for start in range(0, n, block_size)]
+        snapshot = fm.snapshot(self._product_tokens)
+        products = list(fm.products)
+        capacity = self.neighbors.capacity
+        heads = self.neighbors.head_capacity
+        
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(snapshot, self._popularity_range())) as pool:
+            for block in pool.map(_score_block, blocks, [capacity] * len(blocks), [heads] * len(blocks)):
+                for row, top_rows, top_scores, sequences in block:
+                    similarities = top_scores.tolist()
+                    keys = [(-similarity, sequence) for similarity, sequence in zip(similarities, sequences.tolist())]
+                    top = [(products[i], similarity) for i, similarity in zip(top_rows.tolist(), similarities)]
+                    self.neighbors.set_row(products[row].product_id, keys, top, n - 1, prefix=min(capacity, n - 1))
+        return len(self.neighbors)
+    
+    def get_neighbors(self, product):
+        """
+        Get a product's materialized neighbors, building the row if needed.
+        The list is the product's top neighbors followed by the best
+        neighbors of every (category, price tier) group that are not among
+        them (see NeighborTable).
+        
+        Args:
+            product: Product object
+            
+        Returns:
+            Tuple (list of (neighbor, similarity) best first, True if the list
+            holds every other product)
+        """
+        self._sync_neighbor_range()
+        own_group = (product.category, self.product_tiers.get(product.product_id))
+        if self.neighbors.lists_heads(product.product_id, self.group_sizes, own_group):
+            return self.neighbors.get(product.product_id)
+        return self._build_neighbor_row(product)
+    
+    def price_tier_index(self, price):
+        """Index of a price in PRICE_TIERS."""
+        return bisect_right(self.PRICE_TIER_BOUNDS, price)
+    
+    def _tokenize(self, name):
+        """Convert a name to an interned frozenset of keyword token IDs."""
+        token_ids = self.token_ids
+        tokens = set()
+        for word in self.extract_keywords(name):
+            token = token_ids.get(word)
+            if token is None:
+                token = token_ids[word] = len(token_ids)
+            tokens.add(token)
+        return frozenset(tokens)
+    
+    def _product_tokens(self, product):
+        """Get a product's cached token set, tokenizing if the cache is stale."""
+        entry = self.product_tokens.get(product.product_id)
+        if entry is not None and entry[0] is product:
+            return entry[1]
+        return self._tokenize(product.name)
     
     def extract_keywords(self, text):
         """Extract keywords from product name."""
         # Convert to lowercase and split by common separators
-        words = re.findall(r'\b\w+\b', text.lower())
+        words = WORD_PATTERN.findall(text.lower())
         # Filter out common stop words
-        stop_words = {'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of', 'with', 'by'}
+        stop_words = self.STOP_WORDS
         return [w for w in words if w not in stop_words and len(w) > 2]
     
     def name_similarity(self, name1, name2):
         """Calculate name similarity based on common keywords."""
         keywords1 = set(self.extract_keywords(name1))
         keywords2 = set(self.extract_keywords(name2))
-        
+        return self._jaccard(keywords1, keywords2)
+    
+    def _jaccard(self, keywords1, keywords2):
+        """Jaccard similarity of two keyword (or token ID) sets."""
         if not keywords1 or not keywords2:
             return 0.0
         
@@ -133,8 +459,8 @@ class RecommendationEngine:
         # 1. Category relationship (highest priority - 35%)
         category_score = self.category_relationship_score(product1.category, product2.category)
         
-        # 2. Name/Keyword similarity (25%)
-        name_sim = self.name_similarity(product1.name, product2.name)
+        # 2. Name/Keyword similarity (25%), on cached token sets
+        name_sim = self._jaccard(self._product_tokens(product1), self._product_tokens(product2))
         
         # 3. Price tier similarity (20%)
         price_tier_sim = self.price_tier_similarity(product1.price, product2.price)
@@ -144,10 +470,10 @@ class RecommendationEngine:
         rating_similarity = max(0, 1 - (rating_diff / 2.5))  # More sensitive to rating differences
         
         # 5. Popularity similarity (5%) - bonus for popular products
-        all_products = self.search_engine.get_all_products()
-        if all_products:
-            max_pop = max(p.popularity for p in all_products)
-            min_pop = min(p.popularity for p in all_products)
+        stats = self.search_engine.stats
+        if stats.count:
+            max_pop = stats.max('popularity')
+            min_pop = stats.min('popularity')
             pop_range = max_pop - min_pop if max_pop > min_pop else 1
             
             # Normalize both popularities
@@ -173,14 +499,223 @@ class RecommendationEngine:
         
         return similarity
     
-    def get_recommendations(self, product_id, limit=12):
+    def score_all(self, target_product, rows=None):
+        """
+        Vectorized calculate_similarity() of a target against every catalog product.
+        Computes the same floating-point operations in the same order, so
+        scores are identical to the per-pair path.
+        
+        Args:
+            target_product: Product to compare against the catalog
+            rows: Array of feature-matrix rows to score (default: every row)
+            
+        Returns:
+            Array of similarity scores, one per scored row
+        """
+        fm = self.features
+        code = fm.categories.get(target_product.category)
+        if code is not None:
+            category_row = fm.category_matrix[code]
+        else:
+            category_row = np.array([self.category_relationship_score(target_product.category, c)
+                                     for c in fm.categories], dtype=np.float64)
+        return fm.similarities(category_row, self._product_tokens(target_product),
+                               self.price_tier_index(target_product.price), target_product.rating,
+                               target_product.popularity, self._popularity_range(), rows)
+    
+    def _popularity_range(self):
+        """(min, max) popularity of the catalog, or None if it is empty."""
+        stats = self.search_engine.stats
+        if not stats.count:
+            return None
+        return stats.min('popularity'), stats.max('popularity')
+    
+    def _top_candidates(self, target_product, count, scored=None, per_group=0):
+        """
+        Select the `count` most similar products, best first.
+        Equivalent to sorting every candidate by similarity (ties in catalog
+        order) and keeping the head, in O(n log count).
+        
+        Args:
+            target_product: Product to find candidates for
+            count: Number of candidates to return
+            scored: Scores from a previous call for the same target, to reuse
+            per_group: Also include the best `per_group` candidates of every
+                (category, price tier) group, so diversification caps can be met
+            
+        Returns:
+            Tuple (list of (product, similarity), number of candidates in the
+            catalog, scores to pass back when widening)
+        """
+        if self.features is None:
+            if scored is None:
+                scored = [
+                    (product, self.calculate_similarity(target_product, product))
+                    for product in self.search_engine.get_all_products()
+                    if product.product_id != target_product.product_id
+                ]
+            # nlargest is stable: ties keep catalog order
+            top = heapq.nlargest(count, enumerate(scored), key=lambda x: x[1][1])
+            if per_group and count < len(scored):
+                groups = {}
+                for entry in enumerate(scored):
+                    product = entry[1][0]
+                    key = (product.category, self.product_tiers.get(product.product_id))
+                    groups.setdefault(key, []).append(entry)
+                chosen = {index for index, _ in top}
+                for entries in groups.values():
+                    top.extend(entry for entry in heapq.nlargest(per_group, entries, key=lambda x: x[1][1])
+                               if entry[0] not in chosen)
+                top.sort(key=lambda x: (-x[1][1], x[0]))
+            return [entry for _, entry in top], len(scored), scored
+        
+        fm = self.features
+        if scored is None:
+            scored = self.score_all(target_product)
+        scores = scored
+        skip = fm.row_of.get(target_product.product_id)
+        # Descending score, ties in catalog order (as the stable sort did)
+        order, total = fm.top_rows(scores, count, exclude=skip, per_group=per_group)
+        
+        products = fm.products
+        return [(products[i], float(scores[i])) for i in order.tolist()], total, scored
+    
+    def _add_approximate(self, product, tier, tokens):
+        """Add a product to the LSH index and its (category, tier) rating block."""
+        self.lsh.add(product.product_id, (product.category, tier), tokens)
+        block = self.rating_blocks.get((product.category, tier))
+        if block is None:
+            block = self.rating_blocks[(product.category, tier)] = SortedIndex(key=_rating_block_key)
+        block.insert(product)
+    
+    def _build_approximate_index(self):
+        """
+        Build the LSH index and rating blocks on first use. Until an
+        approximate query needs them, catalog writes skip their upkeep.
+        """
+        if self.lsh is not None:
+            return
+        self.lsh = MinHashLSH()
+        self.rating_blocks = {}
+        product_tiers = self.product_tiers
+        for product_id, (product, tokens) in self.product_tokens.items():
+            self._add_approximate(product, product_tiers[product_id], tokens)
+    
+    @staticmethod
+    def _rating_nearest(block, rating):
+        """Products of a rating block, nearest to `rating` first."""
+        keys, items = block.keys, block.items
+        right = bisect_left(keys, (rating,))
+        left = right - 1
+        while left >= 0 or right < len(items):
+            if right >= len(items) or (left >= 0 and rating - keys[left][0] <= keys[right][0] - rating):
+                yield items[left]
+                left -= 1
+            else:
+                yield items[right]
+                right += 1
+    
+    def approximate_candidates(self, target_product, count=None, per_group=0):
+        """
+        Generate likely neighbors without scoring the catalog, then re-rank
+        them exactly (vectorized over the candidate rows when NumPy is
+        available, else with calculate_similarity()).
+        Candidates are products whose keywords collide with the target's in
+        the MinHash LSH index (same or complementary category, price tier
+        within one step), topped up with the products closest in rating in
+        the target's own category, nearest price tiers first.
+        
+        Args:
+            target_product: Product to find candidates for
+            count: Number of candidates (default APPROXIMATE_CANDIDATES)
+            per_group: Also include the `per_group` products nearest in rating
+                of every (category, price tier) block, so diversification
+                caps can be met
+            
+        Returns:
+            List of (product, similarity), best first
+        """
+        count = count or self.APPROXIMATE_CANDIDATES
+        self._build_approximate_index()
+        tier = self.price_tier_index(target_product.price)
+        tiers = [t for t in (tier, tier - 1, tier + 1) if 0 <= t < len(self.PRICE_TIERS)]
+        categories = [target_product.category] + [
+            c for c in {category for category, _ in self.rating_blocks}
+            if c != target_product.category
+            and self.category_relationship_score(target_product.category, c) >= 0.6
+        ]
+        
+        found = {target_product.product_id: None}
+        tokens = self._product_tokens(target_product)
+        signature = self.lsh.signature(tokens)
+        own_block = (target_product.category, tier)
+        
+        # 1. Keyword neighbors in the target's own block
+        for product_id in self.lsh.query([own_block], tokens, count, signature):
+            if len(found) > count // 3:
+                break
+            found[product_id] = None
+        
+        # 2. The same category's products nearest in rating, nearest tiers first
+        for t in tiers:
+            block = self.rating_blocks.get((target_product.category, t))
+            if block is None:
+                continue
+            for product in self._rating_nearest(block, target_product.rating):
+                if len(found) > 2 * count // 3:
+                    break
+                found[product.product_id] = None
+        
+        # 3. Keyword neighbors in nearby tiers and complementary categories
+        groups = [(c, t) for c in categories for t in tiers if (c, t) != own_block]
+        for product_id in self.lsh.query(groups, tokens, count, signature):
+            if len(found) > count:
+                break
+            found[product_id] = None
+        
+        # 4. Likely heads of every block: keyword neighbors, then nearest in rating
+        if per_group:
+            others = [key for key in self.rating_blocks if key not in groups and key != own_block]
+            for product_id in islice(self.lsh.query(others, tokens, per_group, signature), count):
+                found[product_id] = None
+            for block in self.rating_blocks.values():
+                for product in islice(self._rating_nearest(block, target_product.rating), per_group):
+                    found[product.product_id] = None
+        found.pop(target_product.product_id, None)
+        
+        if self.features is not None:
+            fm = self.features
+            row_of = fm.row_of
+            rows = np.fromiter((row_of[product_id] for product_id in found), dtype=np.intp, count=len(found))
+            scores = self.score_all(target_product, rows)
+            order = np.lexsort((fm.sequence[rows], -scores))
+            products, rows = fm.products, rows.tolist()
+            return [(products[rows[i]], float(scores[i])) for i in order.tolist()]
+        
+        product_tokens = self.product_tokens
+        sequence = self.search_engine.sequence
+        ranked = [(product, self.calculate_similarity(target_product, product))
+                  for product in (product_tokens[product_id][0] for product_id in found)]
+        ranked.sort(key=lambda x: (-x[1], sequence.get(x[0].product_id, 0)))
+        return ranked
+    
+    def get_recommendations(self, product_id, limit=12, approximate=False):
         """
         Get improved product recommendations based on a given product.
         Uses diversity to ensure recommendations aren't too similar to each other.
+        Recommendations are picked from the product's materialized neighbors
+        (see get_neighbors). While the diversity caps hold, no (category, price
+        tier) group gives more than min(max_per_category, max_per_tier)
+        products, and rows list that many of every group, so the picks equal
+        diversifying the full ranking; the whole catalog is ranked only when
+        the caps cannot be met at all.
         
         Args:
             product_id: ID of the product to get recommendations for
             limit: Maximum number of recommendations to return
+            approximate: If True, diversify approximate candidates (see
+                approximate_candidates) instead of exact neighbors; opt-in,
+                inexact
             
         Returns:
             List of recommended products sorted by similarity with diversity
@@ -190,93 +725,108 @@ class RecommendationEngine:
         if not target_product:
             return []
         
-        all_products = self.search_engine.get_all_products()
-        recommendations = []
-        
-        for product in all_products:
-            # Skip the product itself
-            if product.product_id == product_id:
-                continue
-            
-            similarity = self.calculate_similarity(target_product, product)
-            recommendations.append((product, similarity))
-        
-        # Sort by similarity (descending)
-        recommendations.sort(key=lambda x: x[1], reverse=True)
-        
-        # Apply diversity filter to avoid too many similar products
-        diverse_recommendations = self._apply_diversity_filter(recommendations, limit)
-        
+        if approximate:
+            count = max(self.APPROXIMATE_CANDIDATES, limit * self.CANDIDATE_POOL_FACTOR)
+            per_group = min(self.max_per_category, self.max_per_tier)
+            candidates = self.approximate_candidates(target_product, count, per_group)
+            return self._diversify(candidates, limit)[0]
+        
+        # Diversify to avoid too many similar products
+        neighbors, complete = self.get_neighbors(target_product)
+        diverse_recommendations, complete = self._diversify(neighbors, limit, exhaustive=complete)
+        if not complete:
+            # Caps cannot be met anywhere in the catalog: diversify the full ranking
+            recommendations, _, _ = self._top_candidates(target_product, len(self.product_tokens))
+            diverse_recommendations, _ = self._diversify(recommendations, limit)
         return diverse_recommendations
     
-    def _apply_diversity_filter(self, recommendations, limit):
-        """Apply diversity filter to recommendations."""
-        if not recommendations:
-            return []
+    def _diversify(self, candidates, limit, exhaustive=True):
+        """
+        Maximal-marginal-relevance style diversification.
         
-        selected = []
-        used_categories = {}
-        used_price_tiers = {}
-        
-        for product, similarity in recommendations:
-            # Get price tier
-            price_tier = 'budget' if product.price < 20 else \
-                        'low' if product.price < 50 else \
-                        'mid-low' if product.price < 100 else \
-                        'mid' if product.price < 300 else \
-                        'mid-high' if product.price < 800 else \
-                        'high' if product.price < 1500 else 'premium'
+        Repeatedly picks the candidate with the best marginal score, i.e. its
+        similarity minus diversity_penalty for every selected product sharing
+        its category or price tier, skipping categories/tiers at their caps.
+        When the caps leave the list short, the caps are lifted. Candidates
+        are grouped by (category, tier), so each pick only compares group heads.
+        
+        Args:
+            candidates: List of (product, similarity), best first
+            limit: Number of products to select
+            exhaustive: False if candidates are only the head of the ranking;
+                if the caps cannot be met from them, selection stops so the
+                caller can widen the pool
             
-            # Check diversity constraints
-            category_count = used_categories.get(product.category, 0)
-            tier_count = used_price_tiers.get(price_tier, 0)
+        Returns:
+            Tuple (selected products, True if the selection is final)
+        """
+        product_tiers = self.product_tiers
+        groups = {}  # (category, tier) -> deque of (rank, product, similarity)
+        for rank, (product, similarity) in enumerate(candidates):
+            tier = product_tiers.get(product.product_id)
+            if tier is None:
+                tier = self.price_tier_index(product.price)
+            key = (product.category, tier)
+            group = groups.get(key)
+            if group is None:
+                group = groups[key] = deque()
+            group.append((rank, product, similarity))
+        
+        penalty = self.diversity_penalty
+        used_categories = {}
+        used_tiers = {}
+        selected = []
+        capped = True
+        
+        while len(selected) < limit and groups:
+            best = None
+            for key, group in groups.items():
+                category, tier = key
+                category_count = used_categories.get(category, 0)
+                tier_count = used_tiers.get(tier, 0)
+                if capped and (category_count >= self.max_per_category or tier_count >= self.max_per_tier):
+                    continue
+                rank, _, similarity = group[0]
+                marginal = similarity - penalty * (category_count + tier_count)
+                if best is None or marginal > best[0] or (marginal == best[0] and rank < best[1]):
+                    best = (marginal, rank, key)
             
-            # Allow up to 3 products from same category, 2 from same price tier
-            if category_count < 3 and tier_count < 2:
-                selected.append(product)
-                used_categories[product.category] = category_count + 1
-                used_price_tiers[price_tier] = tier_count + 1
-                
-                if len(selected) >= limit:
-                    break
+            if best is None:
+                if not exhaustive:
+                    return selected, False
+                capped = False  # Caps cannot be met: fill with the best remaining
+                continue
             
-            # If we haven't filled the limit, be more lenient
-            elif len(selected) < limit * 0.7:
-                selected.append(product)
-                used_categories[product.category] = category_count + 1
-                used_price_tiers[price_tier] = tier_count + 1
-        
-        # If we still don't have enough, fill with remaining top recommendations
-        if len(selected) < limit:
-            for product, similarity in recommendations:
-                if product not in selected:
-                    selected.append(product)
-                    if len(selected) >= limit:
-                        break
-        
-        return selected
+            key = best[2]
+            group = groups[key]
+            selected.append(group.popleft()[1])
+            if not group:
+                del groups[key]
+            category, tier = key
+            used_categories[category] = used_categories.get(category, 0) + 1
+            used_tiers[tier] = used_tiers.get(tier, 0) + 1
+        
+        if len(selected) < limit and not exhaustive:
+            return selected, False
+        return selected, True
     
     def get_recommendations_by_category(self, category, limit=5):
         """
         Get recommendations based on category.
+        Served from the category index, which keeps each category's products
+        in rating order as the catalog changes.
         
         Args:
-            category: Product category
+            category: Product category (case-insensitive)
             limit: Maximum number of recommendations
             
         Returns:
             List of products in the same category, sorted by rating
         """
-        all_products = self.search_engine.get_all_products()
-        category_products = [
-            p for p in all_products 
-            if p.category.lower() == category.lower()
-        ]
-        
-        # Sort by rating (descending)
-        category_products.sort(key=lambda p: p.rating, reverse=True)
-        
-        return category_products[:limit]
+        ranked = self.category_index.get(category.casefold())
+        if ranked is None:
+            return []
+        return ranked.items[:limit]
     
     def get_trending_products(self, limit=5):
         """
@@ -292,7 +842,7 @@ class RecommendationEngine:
         
         # Calculate trending score: (rating * 0.6) + (normalized_popularity * 0.4)
         trending_scores = []
-        max_popularity = max(p.popularity for p in all_products) if all_products else 1
+        max_popularity = self.search_engine.stats.max('popularity') if all_products else 1
         
         for product in all_products:
             normalized_pop = product.popularity / max_popularity
@@ -307,6 +857,8 @@ class RecommendationEngine:
     def get_similar_price_range(self, price, tolerance=0.3, limit=5):
         """
         Get products in similar price range.
+        The range is found by bisection over the search engine's price
+        ordering, and the best rated products in it by top-k selection.
         
         Args:
             price: Target price
@@ -314,19 +866,13 @@ class RecommendationEngine:
             limit: Maximum number of products
             
         Returns:
-            List of products in similar price range
+            List of products in similar price range, sorted by rating
         """
-        all_products = self.search_engine.get_all_products()
         min_price = price * (1 - tolerance)
         max_price = price * (1 + tolerance)
         
-        similar_products = [
-            p for p in all_products
-            if min_price <= p.price <= max_price
-        ]
-        
-        # Sort by rating
-        similar_products.sort(key=lambda p: p.rating, reverse=True)
+        similar_products = self.search_engine.search_by_price_range(min_price, max_price)
         
-        return similar_products[:limit]
+        # Best rated first, ties in catalog order
+        return heapq.nsmallest(limit, similar_products, key=self.rating_key)
 
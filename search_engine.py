@@ -2,42 +2,284 @@
 Search and Indexing Module combining Hash Table and Binary Search.
 """
 
-from hash_table import HashTableSeparateChaining, HashTableOpenAddressing
-from binary_search import binary_search_by_id, binary_search_by_name, binary_search_partial_name
-from sorting import sort_products
+import base64
+import json
+import math
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+
+from hash_table import (HashTableSeparateChaining, HashTableOpenAddressing, HashTableRobinHood,
+                        HashTableFibonacci, ResizeStats)
+from binary_search import binary_search_by_id, binary_search_prefix_range
+from sorting import (sort_products, top_k_products, parse_sort_spec, composite_key_function,
+                     key_to_json, key_from_json)
+from perfect_hash import FrozenHashTable
+from ngram_index import NGramIndex
+from sorted_index import SortedIndex
+from catalog_stats import CatalogStats
 from product import Product
 
 
+def _name_key(product):
+    """Sort key for the name index."""
+    return product.name.lower()
+
+
+def _encode_cursor(scope, key):
+    """Encode the last returned sort key as an opaque cursor string."""
+    data = json.dumps({'s': scope, 'k': key_to_json(key)}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(data.encode('utf-8')).decode('ascii')
+
+
+def _decode_cursor(scope, cursor):
+    """
+    Decode a cursor produced by _encode_cursor() for the same scope.
+    
+    Raises:
+        ValueError: If the cursor is malformed or belongs to another listing
+    """
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        scope_matches = data['s'] == scope
+        key = key_from_json(data['k'])
+    except (ValueError, TypeError, KeyError, AttributeError):
+        raise ValueError("Invalid cursor")
+    if not scope_matches:
+        raise ValueError("Cursor does not match this listing")
+    return key
+
+
+def _page(keys, items, page_size, cursor, scope):
+    """
+    Slice one page after the cursor key; returns (products, next_cursor).
+    
+    Raises:
+        ValueError: If page_size is not positive, or the cursor is invalid or its
+            key does not compare with the listing's keys
+    """
+    if page_size < 1:
+        raise ValueError("page_size must be positive")
+    start = 0
+    if cursor is not None:
+        try:
+            start = bisect_right(keys, _decode_cursor(scope, cursor))
+        except (TypeError, AttributeError):
+            # Key components of the wrong type (or shape) for this listing
+            raise ValueError("Invalid cursor")
+    end = start + page_size
+    page = items[start:end]
+    next_cursor = _encode_cursor(scope, keys[end - 1]) if end < len(items) else None
+    return page, next_cursor
+
+
+def _new_hash_table(hash_type):
+    """Create an empty hash table of the given type."""
+    if hash_type == 'chaining':
+        return HashTableSeparateChaining()
+    elif hash_type == 'robin_hood':
+        return HashTableRobinHood()
+    elif hash_type == 'fibonacci':
+        return HashTableFibonacci()
+    else:
+        return HashTableOpenAddressing()
+
+
 class SearchEngine:
     """Search engine combining hash table and binary search for efficient lookups."""
     
+    # Orderings kept once built; other sort specs share an LRU cache
+    PINNED_ORDERINGS = ((('id', 'asc'),), (('price', 'asc'),), (('name', 'asc'),), (('rating', 'desc'),))
+    MAX_CACHED_ORDERINGS = 16  # Unpinned orderings kept (each is updated on every write)
+    MAX_CACHED_SEARCHES = 32  # Ranked name searches kept for paging
+    
     def __init__(self, hash_type='chaining'):
         """
         Initialize the search engine.
         
         Args:
-            hash_type: 'chaining' or 'open' for hash table type
+            hash_type: 'chaining', 'open', 'robin_hood' or 'fibonacci' (integer
+                product IDs only) for hash table type
         """
-        if hash_type == 'chaining':
-            self.hash_table = HashTableSeparateChaining()
-        else:
-            self.hash_table = HashTableOpenAddressing()
+        self.hash_type = hash_type
+        self.hash_table = _new_hash_table(hash_type)
+        self.frozen = False  # Read-only catalog (see freeze)
+        self.resize_stats = None  # ResizeStats shared by successive hash tables (see enable_index_stats)
         
         self.products_list = []  # For binary search
-        self.sorted_by_id = False
-        self.sorted_by_name = False
+        self.name_index = NGramIndex(n=3)  # Trigram index for substring name search
+        self.name_order = SortedIndex(key=_name_key)  # Lowercased names in sorted order
+        self.stats = CatalogStats()  # Running min/max/sum of price, rating, popularity
+        self.listeners = []  # Notified of catalog changes (see subscribe)
+        
+        # Cached listing orders, keyed by the normalized sort specification
+        self.version = 0  # Catalog mutation counter
+        self.sequence = {}  # product ID -> insertion sequence (stable tie-break)
+        self._next_sequence = 0
+        self.orderings = OrderedDict()  # ((key, order), ...) -> SortedIndex, updated on every write, LRU order
+        self.searches = OrderedDict()  # lowercased query -> (version, keys, products) ranked for search_page, LRU order
     
     def add_product(self, product):
         """
         Add a product to both hash table and list.
+        Adding a product with an existing ID replaces the old product.
         
         Args:
             product: Product object to add
+            
+        Raises:
+            RuntimeError: If the catalog is frozen
+            TypeError, ValueError: If the product is rejected (see
+                _check_product, or sort values that do not compare with the
+                catalog's); the catalog is left unchanged
+        """
+        self._check_mutable()
+        self._check_product(product)
+        existing = self.hash_table.search_product_by_id(product.product_id)
+        if existing is None:
+            self.sequence[product.product_id] = self._next_sequence
+        # The cached orderings go first: they are where a product whose sort
+        # values do not compare with the catalog's fails (TypeError), and a
+        # failed add must leave the catalog unchanged
+        try:
+            self._replace_in_orderings(existing, product)
+            try:
+                self.hash_table.insert_product(product)
+            except Exception:
+                self._replace_in_orderings(product, existing)
+                raise
+        except Exception:
+            if existing is None:
+                del self.sequence[product.product_id]
+            raise
+        if existing is not None:
+            index = self.products_list.index(existing)
+            self.products_list[index] = product
+            self.name_order.remove(existing)
+            self.stats.remove(existing)
+        else:
+            self.products_list.append(product)
+            self._next_sequence += 1
+        self.name_index.add(product)
+        self.name_order.insert(product)
+        self.stats.add(product)
+        self.version += 1
+        
+        for listener in self.listeners:
+            if existing is not None:
+                listener.on_product_removed(existing)
+            listener.on_product_added(product)
+    
+    def _check_product(self, product):
         """
-        self.hash_table.insert_product(product)
-        self.products_list.append(product)
-        self.sorted_by_id = False
-        self.sorted_by_name = False
+        Check the fields the indexes and listeners derive keys from, so a
+        bad product is refused before anything changes.
+        
+        Raises:
+            TypeError: If the name or category is not a string
+            TypeError, ValueError: If the ID cannot be stored in the hash table
+        """
+        if not isinstance(product.name, str):
+            raise TypeError(f"Product name must be a string, got {type(product.name).__name__}")
+        if not isinstance(product.category, str):
+            raise TypeError(f"Product category must be a string, got {type(product.category).__name__}")
+        self.hash_table.check_key(product.product_id)
+    
+    def _replace_in_orderings(self, old, new):
+        """
+        Swap a product in every cached ordering (either may be None), all or
+        nothing: if an insert raises, the orderings are restored first.
+        """
+        orderings = list(self.orderings.values())
+        if old is not None:
+            for ordering in orderings:
+                ordering.remove(old)
+        if new is None:
+            return
+        inserted = []
+        try:
+            for ordering in orderings:
+                ordering.insert(new)
+                inserted.append(ordering)
+        except Exception:
+            for ordering in inserted:
+                ordering.remove(new)
+            if old is not None:
+                for ordering in orderings:
+                    ordering.insert(old)
+            raise
+    
+    def add_products(self, products):
+        """
+        Add many products in one pass: the hash table is sized once and
+        filled directly, and the name index and cached orderings take the
+        batch with one sort and merge each. Listeners with an
+        on_products_added(products) method get the batch in one call.
+        Products whose ID is already in the catalog (or repeats in the
+        batch) replace the earlier product, as with add_product().
+        If any new product is rejected, none of them is added; replacements
+        are applied afterwards, one at a time.
+        
+        Args:
+            products: Iterable of Product objects
+            
+        Raises:
+            RuntimeError: If the catalog is frozen
+            TypeError, ValueError: If a product is rejected (see
+                _check_product), or sort values do not compare with the
+                catalog's
+        """
+        self._check_mutable()
+        new = []
+        repeated = []
+        seen = set()
+        for product in products:
+            self._check_product(product)
+            if product.product_id in seen or self.hash_table.search_product_by_id(product.product_id) is not None:
+                repeated.append(product)
+            else:
+                seen.add(product.product_id)
+                new.append(product)
+        
+        if new:
+            for offset, product in enumerate(new):
+                self.sequence[product.product_id] = self._next_sequence + offset
+            # The steps that can reject the batch go first: merges build new
+            # lists, so the old ones are put back, and bulk_load checks every
+            # ID before changing the table
+            indexes = [self.name_order] + list(self.orderings.values())
+            saved = [(index.keys, index.items) for index in indexes]
+            try:
+                if len(self.name_order) == 0:
+                    self.name_order.load(new)
+                else:
+                    self.name_order.merge(new)
+                # Same order as incremental inserts: the batch follows equal keys
+                for ordering in self.orderings.values():
+                    ordering.merge(new)
+                self.hash_table.bulk_load(new, expected_size=len(self.products_list) + len(new))
+            except Exception:
+                for index, (keys, items) in zip(indexes, saved):
+                    index.keys, index.items = keys, items
+                for product in new:
+                    del self.sequence[product.product_id]
+                raise
+            self._next_sequence += len(new)
+            for product in new:
+                self.products_list.append(product)
+                self.name_index.add(product)
+                self.stats.add(product)
+            self.version += 1
+            
+            for listener in self.listeners:
+                on_products_added = getattr(listener, 'on_products_added', None)
+                if on_products_added is not None:
+                    on_products_added(new)
+                else:
+                    for product in new:
+                        listener.on_product_added(product)
+        
+        for product in repeated:
+            self.add_product(product)
     
     def remove_product(self, product_id):
         """
@@ -48,14 +290,102 @@ class SearchEngine:
             
         Returns:
             True if removed, False otherwise
+            
+        Raises:
+            RuntimeError: If the catalog is frozen
         """
+        self._check_mutable()
+        product = self.hash_table.search_product_by_id(product_id)
         success = self.hash_table.delete_product(product_id)
         if success:
             self.products_list = [p for p in self.products_list if p.product_id != product_id]
-            self.sorted_by_id = False
-            self.sorted_by_name = False
+            self.name_index.remove(product_id)
+            self.name_order.remove(product)
+            self.stats.remove(product)
+            for ordering in self.orderings.values():
+                ordering.remove(product)
+            self.version += 1
+            for listener in self.listeners:
+                listener.on_product_removed(product)
+            del self.sequence[product_id]
         return success
     
+    def freeze(self):
+        """
+        Compile the catalog into a read-only form for serving.
+        Only the ID table is compiled: lookups go through a minimal perfect
+        hash over flat arrays (FrozenHashTable). The name index and sorted
+        orderings are served as they are, with the ID and price orderings
+        built up front. Until unfreeze() is called, add and remove raise
+        RuntimeError.
+        
+        Raises:
+            TypeError: If a product ID is not an integer
+            ValueError: If a product ID is outside the signed 64-bit range
+        """
+        if self.frozen:
+            return
+        self.hash_table = FrozenHashTable(self.products_list)
+        self._get_ordering([('id', 'asc')])
+        self._get_ordering([('price', 'asc')])
+        self.frozen = True
+    
+    def unfreeze(self):
+        """Make a frozen catalog writable again, rebuilding its hash table."""
+        if not self.frozen:
+            return
+        hash_table = _new_hash_table(self.hash_type)
+        if self.resize_stats is not None:
+            hash_table.enable_stats(self.resize_stats)
+        hash_table.bulk_load(self.products_list)
+        self.hash_table = hash_table
+        self.frozen = False
+    
+    def _check_mutable(self):
+        """Raise RuntimeError if the catalog is frozen."""
+        if self.frozen:
+            raise RuntimeError("Catalog is frozen; call unfreeze() before modifying it")
+    
+    def enable_index_stats(self):
+        """
+        Start recording hash table resizes (counts, durations and the latest
+        events) for index_stats(). Until then resizes are not timed. The
+        totals cover the engine's lifetime: they carry over when freeze()
+        and unfreeze() replace the hash table.
+        """
+        if self.resize_stats is None:
+            self.resize_stats = ResizeStats()
+        if not self.frozen:
+            self.hash_table.enable_stats(self.resize_stats)
+    
+    def index_stats(self):
+        """
+        Shape of the ID index: chain and probe length histograms, max chain,
+        tombstones, load factor, bytes used and, once enable_index_stats()
+        was called, resize and rehash totals and the latest resizes.
+        Computed on demand in O(n).
+        
+        Returns:
+            Dict of hash table statistics plus 'hash_type' and 'frozen'
+        """
+        stats = {'hash_type': self.hash_type, 'frozen': self.frozen}
+        stats.update(self.hash_table.stats())
+        if self.resize_stats is not None:
+            stats.update(self.resize_stats.to_dict())
+        return stats
+    
+    def subscribe(self, listener):
+        """
+        Register a listener for catalog changes.
+        The listener's on_product_added(product) and on_product_removed(product)
+        are called after each change; replacing a product calls both. An
+        optional on_products_added(products) receives add_products() batches.
+        
+        Args:
+            listener: Object with on_product_added / on_product_removed methods
+        """
+        self.listeners.append(listener)
+    
     def search_by_id(self, product_id):
         """
         Search for product by ID using hash table (O(1) average).
@@ -70,7 +400,8 @@ class SearchEngine:
     
     def search_by_name_hash(self, name):
         """
-        Search for products by name using hash table.
+        Search for products by name using the trigram index.
+        Only products sharing every trigram of the query are checked.
         
         Args:
             name: Name or partial name to search
@@ -78,33 +409,35 @@ class SearchEngine:
         Returns:
             List of matching products
         """
-        return self.hash_table.search_product_by_name(name)
+        return self.name_index.search(name)
     
     def search_by_name_binary(self, name, exact=False):
         """
-        Search for products by name using binary search.
-        Requires products to be sorted by name first.
+        Search for products by name prefix using binary search
+        over the incrementally maintained name index (O(log n + k)).
         
         Args:
-            name: Name to search for
+            name: Name prefix to search for
             exact: If True, search for exact match only
             
         Returns:
-            List of matching products
+            List of matching products in name order
         """
-        if not self.sorted_by_name:
-            self.products_list = sort_products(self.products_list, sort_by='name', order='asc')
-            self.sorted_by_name = True
-        
+        name_keys = self.name_order.keys
+        name_lower = name.lower()
+        lo, hi = binary_search_prefix_range(name_keys, name_lower)
         if exact:
-            product = binary_search_by_name(self.products_list, name)
-            return [product] if product else []
-        else:
-            return binary_search_partial_name(self.products_list, name)
+            # Exact matches are the leading keys of the prefix range
+            end = lo
+            while end < hi and name_keys[end] == name_lower:
+                end += 1
+            hi = end
+        return self.name_order.items[lo:hi]
     
     def search_by_name(self, name, use_binary=True):
         """
-        Hybrid search: Try binary search first, fallback to hash table.
+        Hybrid search: Prefix matches from binary search first,
+        then the remaining substring matches from the trigram index.
         
         Args:
             name: Name or partial name to search
@@ -115,28 +448,173 @@ class SearchEngine:
         """
         if use_binary and len(self.products_list) > 10:
             # Use binary search for larger datasets
-            return self.search_by_name_binary(name, exact=False)
+            results = self.search_by_name_binary(name, exact=False)
+            found = {p.product_id for p in results}
+            results.extend(p for p in self.search_by_name_hash(name) if p.product_id not in found)
+            return results
         else:
-            # Use hash table search (linear scan, but simpler)
+            # Use trigram index search (substring match)
             return self.search_by_name_hash(name)
     
+    def search_page(self, name, page_size=20, cursor=None):
+        """
+        Search for products by name, one page at a time.
+        Results are ordered prefix matches first, then by name and insertion,
+        and the cursor holds the last result's key, so pages stay consistent
+        while products are added. The ranked matches are cached per query
+        until the catalog changes, so later pages cost O(log m + page_size).
+        
+        Args:
+            name: Name or partial name to search
+            page_size: Number of products per page
+            cursor: Cursor from the previous page, or None for the first page
+            
+        Returns:
+            Tuple (list of products, next cursor or None)
+            
+        Raises:
+            ValueError: If page_size is not positive or the cursor is invalid for this query
+        """
+        name_lower = name.lower()
+        cached = self.searches.get(name_lower)
+        if cached is not None and cached[0] == self.version:
+            self.searches.move_to_end(name_lower)
+            _, keys, items = cached
+        else:
+            sequence = self.sequence
+            ranked = sorted(
+                ((0 if p.name.lower().startswith(name_lower) else 1,
+                  p.name.lower(), sequence[p.product_id]), p)
+                for p in self.search_by_name_hash(name)
+            )
+            keys = [key for key, _ in ranked]
+            items = [p for _, p in ranked]
+            self.searches[name_lower] = (self.version, keys, items)
+            self.searches.move_to_end(name_lower)
+            if len(self.searches) > self.MAX_CACHED_SEARCHES:
+                self.searches.popitem(last=False)
+        return _page(keys, items, page_size, cursor, ['search', name_lower])
+    
+    def search_by_price_range(self, min_price, max_price):
+        """
+        Find products priced within [min_price, max_price] with two bisections
+        over the maintained price ordering (O(log n + k)).
+        
+        Args:
+            min_price: Lowest price to include
+            max_price: Highest price to include
+            
+        Returns:
+            List of matching products in ascending price order
+        """
+        ordering = self._get_ordering([('price', 'asc')])
+        # Keys are (price, insertion sequence)
+        lo = bisect_left(ordering.keys, (min_price,))
+        hi = bisect_right(ordering.keys, (max_price, math.inf))
+        return ordering.items[lo:hi]
+    
     def get_all_products(self):
         """Get all products from the catalog."""
         return self.products_list.copy()
     
-    def sort_products(self, sort_by='price', order='asc', algorithm='merge'):
+    def _get_ordering(self, pairs):
+        """
+        Get the maintained index for a sort specification, building it on
+        first use. Pinned specs stay cached; the rest are evicted least
+        recently used first.
+        """
+        spec = tuple(pairs)
+        ordering = self.orderings.get(spec)
+        if ordering is not None:
+            self.orderings.move_to_end(spec)
+        else:
+            composite = composite_key_function(pairs)
+            sequence = self.sequence
+            # Ties are broken by insertion sequence, like a stable sort
+            key = lambda p: composite(p) + (sequence[p.product_id],)
+            if len(pairs) == 1:
+                # Build with the fastest stable algorithm for the key type
+                (sort_by, order), = pairs
+                products = sort_products(self.products_list, sort_by=sort_by, order=order, algorithm='auto')
+            else:
+                products = sort_products(self.products_list, sort_by=pairs)
+            ordering = SortedIndex(key=key)
+            ordering.load_sorted(products)
+            self.orderings[spec] = ordering
+            self._evict_orderings()
+        return ordering
+    
+    def _evict_orderings(self):
+        """Drop the least recently used unpinned orderings beyond MAX_CACHED_ORDERINGS."""
+        unpinned = [spec for spec in self.orderings if spec not in self.PINNED_ORDERINGS]
+        for spec in unpinned[:max(len(unpinned) - self.MAX_CACHED_ORDERINGS, 0)]:
+            del self.orderings[spec]
+    
+    def sort_products(self, sort_by='price', order='asc', algorithm=None, limit=None):
         """
         Sort all products by specified criteria.
+        Without an explicit algorithm the result comes from a cached ordering
+        that is updated incrementally on add/remove, so no sorting is done;
+        the first build picks radix/counting sort when the key type allows.
         
         Args:
-            sort_by: Sort criteria ('price', 'rating', 'popularity', 'name', 'id')
-            order: Sort order ('asc' or 'desc')
-            algorithm: Sorting algorithm ('quick' or 'merge')
+            sort_by: Sort criteria ('price', 'rating', 'popularity', 'name', 'id'),
+                a list of (key, order) pairs, or a string like 'rating:desc,price:asc'
+            order: Sort order ('asc' or 'desc'), default for keys without one
+            algorithm: Sorting algorithm ('quick', 'merge', 'radix', 'counting'
+                or 'auto'), or None to use the cache
+            limit: If given, return only the first `limit` products; without a
+                cached ordering they are picked by top-k selection in O(n log k)
             
         Returns:
             Sorted list of products
+            
+        Raises:
+            ValueError: If limit is negative
+        """
+        if limit is not None and limit < 0:
+            raise ValueError("limit must not be negative")
+        pairs = parse_sort_spec(sort_by, order)
+        if algorithm is not None:
+            if len(pairs) == 1:
+                (sort_by, order), = pairs
+                products = sort_products(self.products_list, sort_by=sort_by, order=order, algorithm=algorithm)
+            else:
+                products = sort_products(self.products_list, sort_by=pairs, algorithm=algorithm)
+            return products if limit is None else products[:limit]
+        
+        if limit is not None:
+            ordering = self.orderings.get(tuple(pairs))
+            if ordering is None:
+                return top_k_products(self.products_list, limit, sort_by=pairs)
+            return ordering.items[:limit]
+        
+        return list(self._get_ordering(pairs).items)
+    
+    def page_products(self, sort_by='id', order='asc', page_size=20, cursor=None):
+        """
+        Get one page of sorted products using keyset pagination.
+        The cursor encodes the last product's sort key (including its unique
+        insertion sequence), so a page is found with one bisection in
+        O(log n + page_size) at any depth, and inserts before the cursor
+        do not shift later pages.
+        
+        Args:
+            sort_by: Sort criteria, list of (key, order) pairs or 'rating:desc,price:asc'
+            order: Sort order ('asc' or 'desc')
+            page_size: Number of products per page
+            cursor: Cursor from the previous page, or None for the first page
+            
+        Returns:
+            Tuple (list of products, next cursor or None)
+            
+        Raises:
+            ValueError: If page_size is not positive or the cursor is invalid for this sort
         """
-        return sort_products(self.products_list, sort_by=sort_by, order=order, algorithm=algorithm)
+        pairs = parse_sort_spec(sort_by, order)
+        ordering = self._get_ordering(pairs)
+        scope = ['list'] + [list(pair) for pair in pairs]
+        return _page(ordering.keys, ordering.items, page_size, cursor, scope)
     
     def get_product_count(self):
         """Get total number of products."""
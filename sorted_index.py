@@ -0,0 +1,113 @@
+"""
+Incrementally maintained sorted index of products.
+"""
+
+from bisect import bisect_left, bisect_right
+from operator import itemgetter
+
+
+class SortedIndex:
+    """Products kept in key order with parallel key and item lists."""
+
+    def __init__(self, key, products=None):
+        """
+        Initialize the sorted index.
+
+        Args:
+            key: Function mapping a product to its sort key
+            products: Optional products to load with a single sort
+        """
+        self.key = key
+        self.keys = []
+        self.items = []
+        if products:
+            self.load(products)
+
+    def load(self, products):
+        """
+        Replace the contents with products, sorting once (stable).
+
+        Args:
+            products: Iterable of products to index
+        """
+        decorated = sorted(((self.key(p), i, p) for i, p in enumerate(products)),
+                           key=lambda entry: (entry[0], entry[1]))
+        self.keys = [entry[0] for entry in decorated]
+        self.items = [entry[2] for entry in decorated]
+
+    def load_sorted(self, products):
+        """
+        Replace the contents with products already in key order.
+
+        Args:
+            products: List of products sorted by the index key
+        """
+        self.items = list(products)
+        self.keys = [self.key(p) for p in self.items]
+
+    def merge(self, products):
+        """
+        Insert many products with one sort of the batch and one linear merge,
+        in O(n + k log n) instead of k list insertions. Equal keys keep the
+        existing products first, as with insert().
+
+        Args:
+            products: Iterable of products to insert
+        """
+        batch = sorted(((self.key(p), p) for p in products), key=itemgetter(0))
+        if not batch:
+            return
+        old_keys, old_items = self.keys, self.items
+        keys, items = [], []
+        lo = 0
+        for key, product in batch:
+            # Copy the run of existing products up to the batch product's slot
+            hi = bisect_right(old_keys, key, lo)
+            keys.extend(old_keys[lo:hi])
+            items.extend(old_items[lo:hi])
+            keys.append(key)
+            items.append(product)
+            lo = hi
+        keys.extend(old_keys[lo:])
+        items.extend(old_items[lo:])
+        self.keys = keys
+        self.items = items
+
+    def insert(self, product):
+        """
+        Insert a product after any products with an equal key.
+
+        Args:
+            product: Product object to insert
+
+        Returns:
+            Position the product was inserted at
+        """
+        key = self.key(product)
+        index = bisect_right(self.keys, key)
+        self.keys.insert(index, key)
+        self.items.insert(index, product)
+        return index
+
+    def remove(self, product):
+        """
+        Remove a product, located by bisecting on its key.
+
+        Args:
+            product: Product object to remove (as it was inserted)
+
+        Returns:
+            True if removed, False if not found
+        """
+        key = self.key(product)
+        index = bisect_left(self.keys, key)
+        while index < len(self.keys) and self.keys[index] == key:
+            if self.items[index].product_id == product.product_id:
+                del self.keys[index]
+                del self.items[index]
+                return True
+            index += 1
+        return False
+
+    def __len__(self):
+        return len(self.items)
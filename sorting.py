@@ -2,12 +2,301 @@
 Sorting algorithms: Quick Sort and Merge Sort for product ranking.
 """
 
+import heapq
+import operator
+
 from product import Product
 
 
+SORT_KEYS = ('price', 'rating', 'popularity', 'name', 'id')
+
+
+def sort_key_function(key):
+    """
+    Get a function extracting the sort value for a sort key.
+    Unknown keys fall back to price, like the sorting algorithms do.
+    
+    Args:
+        key: Sort key ('price', 'rating', 'popularity', 'name', 'id')
+        
+    Returns:
+        Function mapping a product to its sort value
+    """
+    if key == 'rating':
+        return lambda product: product.rating
+    elif key == 'popularity':
+        return lambda product: product.popularity
+    elif key == 'name':
+        return lambda product: product.name.lower()
+    elif key == 'id':
+        return lambda product: product.product_id
+    else:
+        return lambda product: product.price
+
+
+class _Descending:
+    """Wrapper that inverts comparisons, for descending non-numeric sort values."""
+    
+    __slots__ = ('value',)
+    
+    def __init__(self, value):
+        self.value = value
+    
+    def __eq__(self, other):
+        if not isinstance(other, _Descending):
+            return NotImplemented
+        return self.value == other.value
+    
+    def __lt__(self, other):
+        if not isinstance(other, _Descending):
+            return NotImplemented
+        return other.value < self.value
+    
+    def __le__(self, other):
+        if not isinstance(other, _Descending):
+            return NotImplemented
+        return other.value <= self.value
+    
+    def __gt__(self, other):
+        if not isinstance(other, _Descending):
+            return NotImplemented
+        return other.value > self.value
+    
+    def __ge__(self, other):
+        if not isinstance(other, _Descending):
+            return NotImplemented
+        return other.value >= self.value
+    
+    def __repr__(self):
+        return f"_Descending({self.value!r})"
+
+
+def parse_sort_spec(sort_by, order='asc'):
+    """
+    Normalize a sort specification into a list of (key, order) pairs.
+    
+    Accepts a single key ('price'), a comma-separated string with optional
+    per-key orders ('rating:desc,price:asc'), or a list of keys / (key, order)
+    pairs. Keys without an order use the default order; unknown keys fall
+    back to price and unknown orders to ascending. A repeated key is dropped:
+    it could only break ties between equal values of the same key.
+    
+    Args:
+        sort_by: Sort specification
+        order: Default sort order ('asc' or 'desc')
+        
+    Returns:
+        List of (key, order) pairs
+    """
+    if isinstance(sort_by, str):
+        sort_by = [part.strip() for part in sort_by.split(',') if part.strip()] or ['price']
+    
+    pairs = []
+    seen = set()
+    for entry in sort_by:
+        if isinstance(entry, str):
+            key, _, key_order = entry.partition(':')
+        else:
+            key, key_order = entry
+        key = key.strip().lower()
+        key = key if key in SORT_KEYS else 'price'
+        key_order = (key_order or order).strip().lower()
+        if key not in seen:
+            seen.add(key)
+            pairs.append((key, 'desc' if key_order == 'desc' else 'asc'))
+    return pairs
+
+
+def composite_key_function(pairs):
+    """
+    Compile (key, order) pairs into a single ascending tuple-key function.
+    Descending numeric values are negated, other values are wrapped.
+    
+    Args:
+        pairs: List of (key, order) pairs, as from parse_sort_spec()
+        
+    Returns:
+        Function mapping a product to a tuple sort key
+    """
+    getters = []
+    for key, key_order in pairs:
+        get_value = sort_key_function(key)
+        if key_order == 'desc':
+            if key in ('price', 'rating', 'popularity'):
+                getters.append(lambda p, get_value=get_value: -get_value(p))
+            else:
+                getters.append(lambda p, get_value=get_value: _descending(get_value(p)))
+        else:
+            getters.append(get_value)
+    
+    if len(getters) == 1:
+        get_first = getters[0]
+        return lambda p: (get_first(p),)
+    return lambda p: tuple(get(p) for get in getters)
+
+
+def _descending(value):
+    """Invert a sort value: negate numbers, wrap anything else."""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return -value
+    return _Descending(value)
+
+
+def key_to_json(key):
+    """
+    Convert a compiled sort key tuple into a JSON-serializable list.
+    
+    Args:
+        key: Tuple key, as from composite_key_function()
+        
+    Returns:
+        List with descending wrappers encoded as {'desc': value}
+    """
+    return [{'desc': part.value} if isinstance(part, _Descending) else part for part in key]
+
+
+def key_from_json(data):
+    """
+    Rebuild a compiled sort key tuple from key_to_json() output.
+    
+    Args:
+        data: List produced by key_to_json()
+        
+    Returns:
+        Tuple key comparable with composite_key_function() keys
+    """
+    return tuple(_Descending(part['desc']) if isinstance(part, dict) else part for part in data)
+
+
+INSERTION_SORT_THRESHOLD = 16  # Ranges this small are finished with insertion sort
+NINTHER_THRESHOLD = 128  # Ranges larger than this use a ninther pivot
+
+
+def _insertion_sort(keys, items, lo, hi):
+    """Sort keys[lo:hi] (and items alongside) with insertion sort."""
+    for i in range(lo + 1, hi):
+        k = keys[i]
+        item = items[i]
+        j = i - 1
+        while j >= lo and keys[j] > k:
+            keys[j + 1] = keys[j]
+            items[j + 1] = items[j]
+            j -= 1
+        keys[j + 1] = k
+        items[j + 1] = item
+
+
+def _heapsort(keys, items, lo, hi):
+    """Sort keys[lo:hi] (and items alongside) with heapsort."""
+    n = hi - lo
+    
+    def sift_down(root, end):
+        while True:
+            child = 2 * root + 1
+            if child >= end:
+                return
+            if child + 1 < end and keys[lo + child] < keys[lo + child + 1]:
+                child += 1
+            if not keys[lo + root] < keys[lo + child]:
+                return
+            a, b = lo + root, lo + child
+            keys[a], keys[b] = keys[b], keys[a]
+            items[a], items[b] = items[b], items[a]
+            root = child
+    
+    for start in range(n // 2 - 1, -1, -1):
+        sift_down(start, n)
+    for end in range(n - 1, 0, -1):
+        b = lo + end
+        keys[lo], keys[b] = keys[b], keys[lo]
+        items[lo], items[b] = items[b], items[lo]
+        sift_down(0, end)
+
+
+def _median_of_three(keys, a, b, c):
+    """Index of the median key among positions a, b and c."""
+    ka, kb, kc = keys[a], keys[b], keys[c]
+    if ka < kb:
+        if kb < kc:
+            return b
+        return c if ka < kc else a
+    if ka < kc:
+        return a
+    return c if kb < kc else b
+
+
+def _introsort(keys, items):
+    """
+    Sort keys ascending in place, applying the same moves to items.
+    
+    Iterative quicksort with median-of-three (ninther on large ranges) pivots
+    and Hoare partitioning; ranges that exceed the depth budget fall back to
+    heapsort, and small ranges are finished with insertion sort.
+    """
+    n = len(keys)
+    if n < 2:
+        return
+    
+    stack = [(0, n, 2 * n.bit_length())]
+    while stack:
+        lo, hi, depth = stack.pop()
+        
+        while hi - lo > INSERTION_SORT_THRESHOLD:
+            if depth == 0:
+                _heapsort(keys, items, lo, hi)
+                lo = hi
+                break
+            depth -= 1
+            
+            last = hi - 1
+            mid = lo + (hi - lo) // 2
+            if hi - lo > NINTHER_THRESHOLD:
+                step = (hi - lo) // 8
+                pivot_index = _median_of_three(
+                    keys,
+                    _median_of_three(keys, lo, lo + step, lo + 2 * step),
+                    _median_of_three(keys, mid - step, mid, mid + step),
+                    _median_of_three(keys, last - 2 * step, last - step, last),
+                )
+            else:
+                pivot_index = _median_of_three(keys, lo, mid, last)
+            
+            # Move the pivot to the front so the Hoare split is always proper
+            keys[lo], keys[pivot_index] = keys[pivot_index], keys[lo]
+            items[lo], items[pivot_index] = items[pivot_index], items[lo]
+            pivot = keys[lo]
+            
+            i, j = lo - 1, hi
+            while True:
+                i += 1
+                while keys[i] < pivot:
+                    i += 1
+                j -= 1
+                while pivot < keys[j]:
+                    j -= 1
+                if i >= j:
+                    break
+                keys[i], keys[j] = keys[j], keys[i]
+                items[i], items[j] = items[j], items[i]
+            split = j + 1
+            
+            # Defer the larger side, keep working on the smaller one
+            if split - lo < hi - split:
+                stack.append((split, hi, depth))
+                hi = split
+            else:
+                stack.append((lo, split, depth))
+                lo = split
+        
+        if hi - lo > 1:
+            _insertion_sort(keys, items, lo, hi)
+
+
 def quick_sort(products, key='price', reverse=False):
     """
-    Quick Sort implementation for products.
+    Quick Sort implementation for products (introsort, not stable).
+    Sort values are extracted once; already-sorted and adversarial
+    inputs stay O(n log n) and never recurse.
     
     Args:
         products: List of products to sort
@@ -21,51 +310,128 @@ def quick_sort(products, key='price', reverse=False):
         return products
     
     products = products.copy()  # Don't modify original
+    get_value = sort_key_function(key)
+    keys = [get_value(p) for p in products]
     
-    def get_value(product):
-        if key == 'price':
-            return product.price
-        elif key == 'rating':
-            return product.rating
-        elif key == 'popularity':
-            return product.popularity
-        elif key == 'name':
-            return product.name.lower()
-        elif key == 'id':
-            return product.product_id
-        else:
-            return product.price
+    _introsort(keys, products)
+    
+    if reverse:
+        products.reverse()
+    return products
+
+
+MIN_RUN = 32  # Natural runs shorter than this are extended by insertion sort
+
+
+def _merge_sort_keys(keys, items, reverse=False):
+    """
+    Stable bottom-up merge sort of items by precomputed keys.
+    
+    Natural runs are detected first (strictly descending runs are reversed
+    in place) and short runs are extended to MIN_RUN by insertion sort.
+    Runs are then merged pairwise, ping-ponging between the input lists
+    and one preallocated buffer pair.
     
-    def partition(arr, low, high):
-        pivot = get_value(arr[high])
-        i = low - 1
+    Args:
+        keys: List of sort values, modified in place
+        items: List of items parallel to keys, modified in place
+        reverse: If True, sort in descending order (still stable)
         
-        for j in range(low, high):
-            if reverse:
-                if get_value(arr[j]) >= pivot:
-                    i += 1
-                    arr[i], arr[j] = arr[j], arr[i]
+    Returns:
+        Sorted list of items (either items or the buffer)
+    """
+    n = len(keys)
+    if n < 2:
+        return items
+    
+    # precedes(a, b): a must come strictly before b
+    precedes = operator.gt if reverse else operator.lt
+    
+    # 1. Split into natural runs, each at least MIN_RUN long
+    runs = [0]
+    lo = 0
+    while lo < n:
+        hi = lo + 1
+        if hi < n:
+            if precedes(keys[hi], keys[lo]):
+                while hi + 1 < n and precedes(keys[hi + 1], keys[hi]):
+                    hi += 1
+                hi += 1
+                keys[lo:hi] = keys[lo:hi][::-1]
+                items[lo:hi] = items[lo:hi][::-1]
             else:
-                if get_value(arr[j]) <= pivot:
-                    i += 1
-                    arr[i], arr[j] = arr[j], arr[i]
+                while hi + 1 < n and not precedes(keys[hi + 1], keys[hi]):
+                    hi += 1
+                hi += 1
         
-        arr[i + 1], arr[high] = arr[high], arr[i + 1]
-        return i + 1
+        end = min(n, lo + MIN_RUN)
+        if hi < end:
+            for i in range(hi, end):
+                k = keys[i]
+                item = items[i]
+                j = i - 1
+                while j >= lo and precedes(k, keys[j]):
+                    keys[j + 1] = keys[j]
+                    items[j + 1] = items[j]
+                    j -= 1
+                keys[j + 1] = k
+                items[j + 1] = item
+            hi = end
+        runs.append(hi)
+        lo = hi
     
-    def quick_sort_helper(arr, low, high):
-        if low < high:
-            pi = partition(arr, low, high)
-            quick_sort_helper(arr, low, pi - 1)
-            quick_sort_helper(arr, pi + 1, high)
+    # 2. Merge adjacent runs, alternating between the two buffers
+    src_keys, src_items = keys, items
+    dst_keys, dst_items = [None] * n, [None] * n
+    while len(runs) > 2:
+        merged = [0]
+        for r in range(0, len(runs) - 1, 2):
+            lo = runs[r]
+            if r + 2 >= len(runs):
+                # Odd run out: carry over unchanged
+                hi = runs[r + 1]
+                dst_keys[lo:hi] = src_keys[lo:hi]
+                dst_items[lo:hi] = src_items[lo:hi]
+                merged.append(hi)
+                continue
+            mid, hi = runs[r + 1], runs[r + 2]
+            merged.append(hi)
+            
+            if not precedes(src_keys[mid], src_keys[mid - 1]):
+                # Runs are already in order
+                dst_keys[lo:hi] = src_keys[lo:hi]
+                dst_items[lo:hi] = src_items[lo:hi]
+                continue
+            
+            i, j, k = lo, mid, lo
+            while i < mid and j < hi:
+                if precedes(src_keys[j], src_keys[i]):
+                    dst_keys[k] = src_keys[j]
+                    dst_items[k] = src_items[j]
+                    j += 1
+                else:
+                    dst_keys[k] = src_keys[i]
+                    dst_items[k] = src_items[i]
+                    i += 1
+                k += 1
+            if i < mid:
+                dst_keys[k:hi] = src_keys[i:mid]
+                dst_items[k:hi] = src_items[i:mid]
+            else:
+                dst_keys[k:hi] = src_keys[j:hi]
+                dst_items[k:hi] = src_items[j:hi]
+        
+        runs = merged
+        src_keys, dst_keys = dst_keys, src_keys
+        src_items, dst_items = dst_items, src_items
     
-    quick_sort_helper(products, 0, len(products) - 1)
-    return products
+    return src_items
 
 
 def merge_sort(products, key='price', reverse=False):
     """
     Merge Sort implementation for products (stable sort).
+    Bottom-up over natural runs with precomputed sort values.
     
     Args:
         products: List of products to sort
@@ -79,82 +445,178 @@ def merge_sort(products, key='price', reverse=False):
         return products
     
     products = products.copy()  # Don't modify original
+    get_value = sort_key_function(key)
+    keys = [get_value(p) for p in products]
     
-    def get_value(product):
-        if key == 'price':
-            return product.price
-        elif key == 'rating':
-            return product.rating
-        elif key == 'popularity':
-            return product.popularity
-        elif key == 'name':
-            return product.name.lower()
-        elif key == 'id':
-            return product.product_id
-        else:
-            return product.price
+    return _merge_sort_keys(keys, products, reverse=reverse)
+
+
+MIN_RADIX_BITS = 8  # Narrowest LSD radix digit (256 buckets)
+MAX_RADIX_BITS = 16  # Widest LSD radix digit (65536 buckets)
+RATING_RESOLUTION = 10  # Counting sort buckets per unit (0.1 steps)
+MAX_COUNTING_BUCKETS = 1 << 16  # Wider value ranges fall back to merge sort
+
+
+def radix_sort(products, key='id', reverse=False):
+    """
+    LSD Radix Sort for integer keys (stable, linear time).
+    Falls back to merge sort when the sort values are not all integers.
     
-    def compare(a, b):
-        """Compare two values based on reverse flag."""
-        val_a = get_value(a)
-        val_b = get_value(b)
+    Args:
+        products: List of products to sort
+        key: Sort key with integer values ('id', 'popularity')
+        reverse: If True, sort in descending order
         
-        if isinstance(val_a, str) and isinstance(val_b, str):
-            if reverse:
-                return val_a >= val_b
-            return val_a <= val_b
-        else:
-            if reverse:
-                return val_a >= val_b
-            return val_a <= val_b
+    Returns:
+        Sorted list of products
+    """
+    if len(products) <= 1:
+        return products
     
-    def merge(left, right):
-        result = []
-        i = j = 0
-        
-        while i < len(left) and j < len(right):
-            if compare(left[i], right[j]):
-                result.append(left[i])
-                i += 1
-            else:
-                result.append(right[j])
-                j += 1
-        
-        result.extend(left[i:])
-        result.extend(right[j:])
-        return result
+    get_value = sort_key_function(key)
+    values = [get_value(p) for p in products]
+    if not all(type(v) is int for v in values):
+        return merge_sort(products, key=key, reverse=reverse)
     
-    def merge_sort_helper(arr):
-        if len(arr) <= 1:
-            return arr
-        
-        mid = len(arr) // 2
-        left = merge_sort_helper(arr[:mid])
-        right = merge_sort_helper(arr[mid:])
+    # Shift to non-negative digits; descending sorts the mirrored values
+    low, high = min(values), max(values)
+    if reverse:
+        values = [high - v for v in values]
+    else:
+        values = [v - low for v in values]
+    
+    # Digit width grows with n (8-16 bits) so large catalogs need few passes
+    n = len(products)
+    span = (high - low).bit_length()
+    max_bits = max(MIN_RADIX_BITS, min(MAX_RADIX_BITS, n.bit_length()))
+    passes = max(1, -(-span // max_bits))
+    bits = -(-span // passes) if span else 1
+    mask = (1 << bits) - 1
+    
+    order = list(range(n))
+    for shift in range(0, passes * bits, bits):
+        buckets = [[] for _ in range(mask + 1)]
+        for i in order:
+            buckets[(values[i] >> shift) & mask].append(i)
+        order = [i for bucket in buckets for i in bucket]
+    
+    return [products[i] for i in order]
+
+
+def counting_sort(products, key='rating', reverse=False):
+    """
+    Counting Sort for bounded one-decimal float keys such as ratings (stable).
+    Values are bucketed at 0.1; falls back to merge sort when a value is not
+    a finite number on the 0.1 grid or the value range is too wide.
+    
+    Args:
+        products: List of products to sort
+        key: Sort key with one-decimal values ('rating')
+        reverse: If True, sort in descending order
         
-        return merge(left, right)
+    Returns:
+        Sorted list of products
+    """
+    if len(products) <= 1:
+        return products
+    
+    get_value = sort_key_function(key)
+    values = [get_value(p) for p in products]
+    try:
+        slots = [round(v * RATING_RESOLUTION) for v in values]
+    except (TypeError, ValueError, OverflowError):
+        # Non-numeric, NaN or infinite values
+        return merge_sort(products, key=key, reverse=reverse)
+    
+    low, high = min(slots), max(slots)
+    if high - low >= MAX_COUNTING_BUCKETS or any(
+            slot / RATING_RESOLUTION != v for slot, v in zip(slots, values)):
+        return merge_sort(products, key=key, reverse=reverse)
     
-    return merge_sort_helper(products)
+    buckets = [[] for _ in range(high - low + 1)]
+    for slot, product in zip(slots, products):
+        buckets[slot - low].append(product)
+    if reverse:
+        buckets.reverse()
+    
+    return [product for bucket in buckets for product in bucket]
+
+
+def auto_algorithm(sort_by):
+    """
+    Pick the fastest algorithm for a sort key.
+    
+    Args:
+        sort_by: Sort criteria ('price', 'rating', 'popularity', 'name', 'id')
+        
+    Returns:
+        'radix' for integer keys, 'counting' for ratings, else 'merge'
+    """
+    if sort_by in ('id', 'popularity'):
+        return 'radix'
+    elif sort_by == 'rating':
+        return 'counting'
+    return 'merge'
 
 
 def sort_products(products, sort_by='price', order='asc', algorithm='merge'):
     """
     Sort products using specified algorithm and criteria.
+    A list of (key, order) pairs sorts by several keys in one pass
+    over compiled tuple keys (merge, or quick when requested).
     
     Args:
         products: List of products to sort
-        sort_by: Sort criteria ('price', 'rating', 'popularity', 'name', 'id')
+        sort_by: Sort criteria ('price', 'rating', 'popularity', 'name', 'id'),
+            or a list of (key, order) pairs such as [('rating', 'desc'), ('price', 'asc')]
         order: Sort order ('asc' or 'desc')
-        algorithm: Sorting algorithm ('quick' or 'merge')
+        algorithm: Sorting algorithm ('quick', 'merge', 'radix', 'counting' or 'auto')
         
     Returns:
         Sorted list of products
     """
+    if not isinstance(sort_by, str):
+        if len(products) <= 1:
+            return products
+        get_key = composite_key_function(parse_sort_spec(sort_by, order))
+        items = products.copy()  # Don't modify original
+        keys = [get_key(p) for p in items]
+        if algorithm == 'quick':
+            _introsort(keys, items)
+            return items
+        return _merge_sort_keys(keys, items)
+    
     reverse = (order == 'desc')
     
+    if algorithm == 'auto':
+        algorithm = auto_algorithm(sort_by)
+    
     if algorithm == 'quick':
         return quick_sort(products, key=sort_by, reverse=reverse)
+    elif algorithm == 'radix':
+        return radix_sort(products, key=sort_by, reverse=reverse)
+    elif algorithm == 'counting':
+        return counting_sort(products, key=sort_by, reverse=reverse)
     else:  # merge sort (default, stable)
         return merge_sort(products, key=sort_by, reverse=reverse)
 
 
+def top_k_products(products, k, sort_by='price', order='asc'):
+    """
+    Select the first k products of a sort without sorting everything.
+    Heap-based partial selection in O(n log k); the result equals the
+    first k products of the stable merge sort.
+    
+    Args:
+        products: List of products to select from
+        k: Number of products to return
+        sort_by: Sort criteria, or a list of (key, order) pairs
+        order: Sort order ('asc' or 'desc')
+        
+    Returns:
+        List of at most k products in sorted order
+    """
+    if k <= 0:
+        return []
+    get_key = composite_key_function(parse_sort_spec(sort_by, order))
+    return heapq.nsmallest(k, products, key=get_key)
@@ -3,10 +3,17 @@ Test script for the E-Commerce Product Search and Recommendation System.
 """
 
 from product import Product
-from hash_table import HashTableSeparateChaining, HashTableOpenAddressing
-from binary_search import binary_search_by_id, binary_search_by_name
-from sorting import quick_sort, merge_sort, sort_products
+from hash_table import (HashTableSeparateChaining, HashTableOpenAddressing, HashTableRobinHood, HashTableFibonacci,
+                        ResizeStats)
+from binary_search import binary_search_by_id, binary_search_by_name, binary_search_prefix_range
+from sorting import (quick_sort, merge_sort, radix_sort, counting_sort, sort_products, top_k_products,
+                     parse_sort_spec)
 from search_engine import SearchEngine
+from ngram_index import NGramIndex
+from catalog_stats import CatalogStats
+from recommendation_engine import RecommendationEngine
+from lsh_index import MinHashLSH
+from perfect_hash import MinimalPerfectHash
 
 
 def test_product():
@@ -57,6 +64,252 @@ def test_hash_table():
     print("✓ Hash Table (Separate Chaining) works correctly\n")
 
 
+def test_hash_table_churn():
+    """Test open addressing tables keep short probes under add/delete churn."""
+    print("=" * 60)
+    print("Testing Hash Tables Under Churn")
+    print("=" * 60)
+    
+    import random
+    rng = random.Random(7)
+    for ht in (HashTableOpenAddressing(size=11), HashTableRobinHood(size=11), HashTableFibonacci(size=8)):
+        live = {}
+        for step in range(20000):
+            product_id = rng.randrange(3000)
+            if product_id in live and rng.random() < 0.55:
+                assert ht.delete_product(product_id)
+                del live[product_id]
+            else:
+                live[product_id] = Product(product_id, f"Item {product_id}", 1.0 + step, 4.0, step)
+                ht.insert_product(live[product_id])
+            assert ht.count == len(live)
+        
+        for product_id in range(3000):
+            assert ht.search_product_by_id(product_id) is live.get(product_id), product_id
+        assert sorted(p.product_id for p in ht.get_all_products()) == sorted(live)
+        
+        # Tombstones are counted against the load factor, and Robin Hood has none
+        assert ht.count + ht.tombstones <= ht.size * 0.85
+        if isinstance(ht, HashTableRobinHood):
+            assert ht.tombstones == 0 and max(ht.distances) < 40
+        if isinstance(ht, HashTableFibonacci):
+            assert ht.size & (ht.size - 1) == 0 and ht.keys.typecode == 'q'
+            assert all(ht.keys[i] == p.product_id for i, p in enumerate(ht.table) if p is not None)
+            assert ht.search_product_by_id("12") is None and not ht.delete_product("12")
+            try:
+                ht.insert_product(Product(1 << 63, "Too Large", 1.0, 1.0, 1))
+                assert False, "IDs outside int64 must be rejected"
+            except ValueError:
+                pass
+        print(f"{type(ht).__name__}: {ht.count} live, {ht.tombstones} tombstones, size {ht.size}")
+    print("✓ Hash tables stay bounded under churn\n")
+
+
+def test_hash_table_stats():
+    """Test hash table statistics and resize tracking."""
+    print("=" * 60)
+    print("Testing Hash Table Stats")
+    print("=" * 60)
+    
+    for cls in (HashTableSeparateChaining, HashTableOpenAddressing, HashTableRobinHood, HashTableFibonacci):
+        ht = cls()
+        ht.insert_product(Product(1, "Before", 1.0, 1.0, 1))
+        assert ht.stats()['resize_count'] is None  # Resizes are only timed once enabled
+        ht.enable_stats()
+        for i in range(2, 1001):
+            ht.insert_product(Product(i, f"Item {i}", 1.0, 1.0, 1))
+        for i in range(2, 1001, 4):
+            ht.delete_product(i)
+        stats = ht.stats()
+        assert stats['count'] == ht.count == 750 and stats['size'] == ht.size
+        assert stats['tombstones'] == ht.tombstones
+        assert sum(stats['probe_histogram']) == 750 and stats['probe_histogram'][stats['max_probe']] > 0
+        assert sum(k * n for k, n in enumerate(stats['chain_histogram'])) == (
+            750 + ht.tombstones if isinstance(ht, HashTableOpenAddressing) else 750)
+        assert stats['max_chain'] >= stats['max_probe'] >= 1
+        assert stats['resize_count'] == len(stats['recent_resizes']) > 0 and stats['resize_seconds'] >= 0
+        assert stats['recent_resizes'][-1]['to_size'] == ht.size and stats['bytes'] > 0
+        print(f"{cls.__name__}: max probe {stats['max_probe']}, max chain {stats['max_chain']}, "
+              f"{stats['resize_count']} resizes, {stats['bytes']} bytes")
+    
+    # Same-size rehashes under churn are counted apart, and the event list is bounded
+    ht = HashTableOpenAddressing()
+    ht.enable_stats()
+    for step in range(20000):
+        ht.insert_product(Product(step, "Churn", 1.0, 1.0, 1))
+        if step >= 100:
+            ht.delete_product(step - 100)
+    stats = ht.stats()
+    assert stats['rehash_count'] > stats['resize_count'] and len(stats['recent_resizes']) <= ResizeStats.RECENT
+    assert stats['rehash_count'] + stats['resize_count'] > ResizeStats.RECENT
+    print(f"Churn: {stats['resize_count']} resizes, {stats['rehash_count']} same-size rehashes")
+    
+    engine = SearchEngine(hash_type='open')
+    engine.enable_index_stats()
+    engine.add_products(Product(i, f"Item {i}", 1.0, 1.0, 1) for i in range(500))
+    for i in range(500, 600):
+        engine.add_product(Product(i, f"Item {i}", 1.0, 1.0, 1))
+    stats = engine.index_stats()
+    assert stats['hash_type'] == 'open' and not stats['frozen'] and stats['count'] == 600
+    resize_count = stats['resize_count']
+    assert resize_count >= 1
+    engine.freeze()
+    stats = engine.index_stats()
+    assert stats['frozen'] and stats['type'] == 'FrozenHashTable' and stats['probe_histogram'] == [0, 600]
+    assert sum(k * n for k, n in enumerate(stats['chain_histogram'])) == 600
+    assert stats['resize_count'] == resize_count  # Totals carry over the engine's tables
+    engine.unfreeze()
+    assert engine.index_stats()['resize_count'] == resize_count  # Loading the empty table is not a resize
+    engine.add_products(Product(i, f"Item {i}", 1.0, 1.0, 1) for i in range(600, 2000))
+    resizes = engine.index_stats()['recent_resizes']
+    assert engine.index_stats()['resize_count'] == resize_count + 1  # Batch growth is recorded too
+    assert resizes[-1]['from_size'] < resizes[-1]['to_size'] == engine.hash_table.size
+    resize_count += 1
+    for i in range(2000, 3000):
+        engine.add_product(Product(i, f"Item {i}", 1.0, 1.0, 1))
+    assert engine.index_stats()['resize_count'] > resize_count
+    print("SearchEngine.index_stats reports the live, frozen and rebuilt tables")
+    print("✓ Hash table stats work correctly\n")
+
+
+def test_bulk_load():
+    """Test bulk loading matches inserting products one by one."""
+    print("=" * 60)
+    print("Testing Bulk Load")
+    print("=" * 60)
+    
+    products = [Product(i * 3, f"Item {i % 50}", 10.0 + i % 97, (i % 11) / 2.2, i % 500) for i in range(3000)]
+    replacements = [Product(i * 3, f"New {i}", 5.0, 1.0, 1) for i in range(0, 3000, 250)]
+    for cls in (HashTableSeparateChaining, HashTableOpenAddressing, HashTableRobinHood, HashTableFibonacci):
+        ht = cls()
+        ht.insert_product(products[0])
+        ht.bulk_load(products[1:] + replacements, expected_size=4000)
+        size = ht.size
+        assert ht.count == 3000
+        for product in products:
+            expected = replacements[product.product_id // 750] if product.product_id % 750 == 0 else product
+            assert ht.search_product_by_id(product.product_id) is expected, (cls.__name__, product)
+        for i in range(3000, 4000):
+            ht.insert_product(Product(i * 3, "Extra", 1.0, 1.0, 1))
+        assert ht.size == size, cls.__name__  # Presized for the expected count
+    print("Bulk-loaded tables hold the same products without resizing")
+    
+    for hash_type in ('chaining', 'open', 'robin_hood', 'fibonacci'):
+        one_by_one = SearchEngine(hash_type=hash_type)
+        bulk = SearchEngine(hash_type=hash_type)
+        for engine in (one_by_one, bulk):
+            engine.add_product(Product(7, "Existing", 1.0, 1.0, 1))
+            RecommendationEngine(engine)
+        for product in products[:500] + replacements[:1]:
+            one_by_one.add_product(product)
+        bulk.add_products(products[:500] + replacements[:1])
+        assert bulk.get_all_products() == one_by_one.get_all_products()
+        assert [p.name for p in bulk.get_all_products()] == [p.name for p in one_by_one.get_all_products()]
+        assert bulk.sort_products('rating:desc,price:asc') == one_by_one.sort_products('rating:desc,price:asc')
+        assert bulk.search_by_name("item 4") == one_by_one.search_by_name("item 4")
+        assert bulk.stats.to_dict() == one_by_one.stats.to_dict()
+        assert bulk.listeners[0].get_recommendations(42, 5) == one_by_one.listeners[0].get_recommendations(42, 5)
+    print("SearchEngine.add_products matches add_product for every hash table")
+    
+    # Later batches merge into cached orderings and neighbor rows instead of dropping them
+    for batch_size in (3, 400):
+        one_by_one, bulk = SearchEngine(), SearchEngine()
+        for engine in (one_by_one, bulk):
+            engine.add_products(products[:200])
+            engine.sort_products('rating:desc,name:asc')
+            RecommendationEngine(engine)
+        bulk.listeners[0].build_neighbors()  # The one-by-one engine ranks from scratch
+        ordering = bulk.orderings[(('rating', 'desc'), ('name', 'asc'))]
+        batch = products[1000:1000 + batch_size]
+        for product in batch:
+            one_by_one.add_product(product)
+        bulk.add_products(batch)
+        assert bulk.orderings[(('rating', 'desc'), ('name', 'asc'))] is ordering
+        assert ordering.items == sort_products(bulk.get_all_products(), sort_by=parse_sort_spec('rating:desc,name:asc'))
+        assert bulk.name_order.items == one_by_one.name_order.items
+        assert (len(bulk.listeners[0].neighbors) > 0) == (batch_size < 200)
+        for product_id in (0, 3000, 3003):
+            assert bulk.listeners[0].get_recommendations(product_id, 5) == \
+                one_by_one.listeners[0].get_recommendations(product_id, 5)
+    print("Batches merge into cached orderings; large ones reset neighbor rows once")
+    
+    # A batch with one bad product is rejected whole, in place or rebuilt
+    for hash_type, bad_id in (('fibonacci', "x"), ('fibonacci', 1 << 63), ('chaining', "x")):
+        for batch_size in (3, 200):
+            failing = SearchEngine(hash_type=hash_type)
+            failing.add_products(products[:50])
+            failing.sort_products('id')
+            count, version, table_count = failing.get_product_count(), failing.version, failing.hash_table.count
+            name_order = failing.name_order.items
+            try:
+                failing.add_products(products[1000:1000 + batch_size] + [Product(bad_id, "Bad", 1.0, 1.0, 1)])
+                assert False, "Batch with a bad product ID accepted"
+            except (TypeError, ValueError):
+                pass
+            assert failing.get_product_count() == count and failing.version == version
+            assert failing.hash_table.count == table_count and failing.search_by_id(3000) is None
+            assert failing.name_order.items == name_order and len(failing.sort_products('id')) == count
+            assert 3000 not in failing.sequence and not failing.search_by_name("bad")
+    print("A batch with a bad product ID leaves the catalog unchanged")
+    print("✓ Bulk load works correctly\n")
+
+
+def test_frozen_catalog():
+    """Test the minimal perfect hash and the frozen catalog mode."""
+    print("=" * 60)
+    print("Testing Frozen Catalog")
+    print("=" * 60)
+    
+    for n in (0, 1, 5, 2000):
+        keys = [(i * 7919 - 5000) * (-1) ** i for i in range(n)]
+        mph = MinimalPerfectHash(keys)
+        assert sorted(mph.index(k) for k in keys) == list(range(n))
+        assert mph.index(10 ** 9) is None and mph.index("1") is None
+    assert MinimalPerfectHash([-2 ** 63, 2 ** 63 - 1]).index(2 ** 63 - 1) is not None
+    for keys, error in (([2 ** 63], ValueError), ([1, 1], ValueError), ([True], TypeError), (["1"], TypeError)):
+        try:
+            MinimalPerfectHash(keys)
+            assert False, f"{keys} accepted"
+        except error:
+            pass
+    assert MinimalPerfectHash([1]).index(True) is None
+    print("Minimal perfect hash maps n keys onto 0..n-1")
+    
+    engine = SearchEngine(hash_type='robin_hood')
+    engine.add_products(Product(i * 5, f"Item {i}", 100.0 - i % 40, (i % 11) / 2.2, i) for i in range(1000))
+    before = engine.sort_products('price', limit=10)
+    engine.freeze()
+    assert engine.frozen
+    for i in range(0, 5000, 7):
+        product = engine.search_by_id(i)
+        assert (product is not None) == (i % 5 == 0) and (product is None or product.product_id == i)
+    assert engine.sort_products('price', limit=10) == before
+    assert [p.name for p in engine.search_by_name("Item 99")][:2] == ["Item 99", "Item 990"]
+    for mutate in (lambda: engine.add_product(Product(1, "New", 1.0, 1.0, 1)),
+                   lambda: engine.add_products([Product(1, "New", 1.0, 1.0, 1)]),
+                   lambda: engine.remove_product(5)):
+        try:
+            mutate()
+            assert False, "Frozen catalog accepted a change"
+        except RuntimeError:
+            pass
+    assert engine.get_product_count() == 1000
+    print("Frozen catalog serves lookups and rejects changes")
+    
+    engine.unfreeze()
+    assert engine.remove_product(5) and engine.search_by_id(5) is None
+    engine.add_product(Product(1, "New", 1.0, 1.0, 1))
+    assert engine.search_by_id(1).name == "New" and engine.search_by_id(10).product_id == 10
+    engine.add_product(Product(2 ** 63, "Too big", 1.0, 1.0, 1))
+    try:
+        engine.freeze()
+        assert False, "64-bit overflow accepted"
+    except ValueError:
+        assert not engine.frozen
+    print("Unfrozen catalog accepts changes again")
+    print("✓ Frozen catalog works correctly\n")
+
+
 def test_binary_search():
     """Test Binary Search."""
     print("=" * 60)
@@ -79,6 +332,18 @@ def test_binary_search():
     products_sorted = sorted(products, key=lambda p: p.name.lower())
     result = binary_search_by_name(products_sorted, "Cherry")
     print(f"Binary search name 'Cherry': {result}")
+    
+    # Prefix range over sorted name keys
+    keys = ["apple", "apricot", "banana", "cherry", "date"]
+    lo, hi = binary_search_prefix_range(keys, "ap")
+    print(f"Prefix range 'ap': {keys[lo:hi]}")
+    assert keys[lo:hi] == ["apple", "apricot"]
+    assert binary_search_prefix_range(keys, "z") == (5, 5)
+    top = "\U0010ffff"
+    keys = sorted(["a", "a" + top, "a" + top + "b", "a" + top * 2, "b", top, top + "x"])
+    lo, hi = binary_search_prefix_range(keys, "a" + top)
+    assert keys[lo:hi] == ["a" + top, "a" + top + "b", "a" + top * 2]
+    assert keys[slice(*binary_search_prefix_range(keys, top))] == [top, top + "x"]
     print("✓ Binary Search works correctly\n")
 
 
@@ -101,12 +366,40 @@ def test_sorting():
     for p in sorted_quick:
         print(f"  {p.name}: ${p.price}")
     
+    # Quick Sort on already-sorted input (used to exceed the recursion limit)
+    many = [Product(i, f"Item {i}", i % 97, 4.0, i) for i in range(5000)]
+    assert quick_sort(many, key='id') == many
+    assert quick_sort(many, key='price', reverse=True)[0].price == 96
+    
     # Merge Sort
     sorted_merge = merge_sort(products, key='rating', reverse=True)
     print("\nMerge Sort by Rating (desc):")
     for p in sorted_merge:
         print(f"  {p.name}: {p.rating}")
     
+    # Merge Sort keeps equal keys in input order, in both directions
+    ties = [Product(i, f"Tie {i}", 10.0, (i % 3) + 1, i) for i in range(200)]
+    for reverse in (False, True):
+        expected = sorted(ties, key=lambda p: p.rating, reverse=reverse)
+        assert [p.product_id for p in merge_sort(ties, key='rating', reverse=reverse)] == \
+            [p.product_id for p in expected]
+    
+    # Linear-time sorts agree with the stable merge sort
+    mixed = [Product((i * 7919) % 503 - 100, f"Item {i}", i * 1.25, (i % 51) / 10, (i * 31) % 400)
+             for i in range(500)]
+    for reverse in (False, True):
+        for key in ('id', 'popularity'):
+            assert [id(p) for p in radix_sort(mixed, key=key, reverse=reverse)] == \
+                [id(p) for p in merge_sort(mixed, key=key, reverse=reverse)]
+        assert [id(p) for p in counting_sort(mixed, key='rating', reverse=reverse)] == \
+            [id(p) for p in merge_sort(mixed, key='rating', reverse=reverse)]
+    # Keys that do not fit fall back to merge sort
+    assert counting_sort(mixed, key='price') == merge_sort(mixed, key='price')
+    for bad in (float('nan'), float('inf')):
+        odd = mixed[:20] + [Product(999, "Odd", 1.0, bad, 1)]
+        assert [id(p) for p in counting_sort(odd, key='rating')] == [id(p) for p in merge_sort(odd, key='rating')]
+    print("\nRadix/Counting sorts match Merge Sort")
+    
     # Using sort_products function
     sorted_products = sort_products(products, sort_by='popularity', order='desc', algorithm='merge')
     print("\nSort by Popularity (desc):")
@@ -146,6 +439,14 @@ def test_search_engine():
     print(f"\nSearch by name 'Laptop': {len(results)} result(s)")
     for r in results:
         print(f"  - {r}")
+    assert [r.product_id for r in engine.search_by_name_binary("laptop")] == [1]
+    assert [r.product_id for r in engine.search_by_name_binary("laptop pro", exact=True)] == [1]
+    
+    # Name index stays sorted across writes without a full re-sort
+    engine.add_product(Product(5, "Laptop Bag", 59.99, 4.3, 750))
+    engine.remove_product(1)
+    assert [r.product_id for r in engine.search_by_name_binary("laptop")] == [5]
+    assert engine.name_order.keys == sorted(p.name.lower() for p in engine.get_all_products())
     
     # Sort products
     sorted_products = engine.sort_products(sort_by='price', order='asc', algorithm='merge')
@@ -156,6 +457,541 @@ def test_search_engine():
     print("✓ Search Engine works correctly\n")
 
 
+def test_ngram_index():
+    """Test trigram name index."""
+    print("=" * 60)
+    print("Testing N-gram Name Index")
+    print("=" * 60)
+    
+    index = NGramIndex(n=3)
+    products = [
+        Product(1, "Laptop Pro", 1299.99, 4.5, 1500),
+        Product(2, "Wireless Mouse", 29.99, 4.2, 800),
+        Product(3, "Gaming Laptop", 1999.99, 4.8, 2000),
+        Product(4, "Laptop Stand", 49.99, 4.4, 500),
+    ]
+    for p in products:
+        index.add(p)
+    
+    results = index.search("LAPTOP")
+    print(f"Search 'LAPTOP': {[p.name for p in results]}")
+    assert [p.product_id for p in results] == [1, 3, 4]
+    assert [p.product_id for p in index.search("ap")] == [1, 3, 4]
+    assert index.search("keyboard") == []
+    
+    index.remove(3)
+    assert [p.product_id for p in index.search("laptop")] == [1, 4]
+    
+    # Renaming a product through the engine re-indexes it
+    engine = SearchEngine()
+    for p in products:
+        engine.add_product(p)
+    engine.add_product(Product(2, "Laptop Sleeve", 24.99, 4.1, 450))
+    results = engine.search_by_name_hash("laptop")
+    print(f"Engine search after rename: {[p.name for p in results]}")
+    assert [p.product_id for p in results] == [1, 2, 3, 4]  # The renamed product keeps its catalog place
+    assert [p.product_id for p in engine.search_by_name_hash("la")] == [1, 2, 3, 4]
+    assert engine.search_by_name_hash("mouse") == []
+    assert engine.get_product_count() == 4
+    print("✓ N-gram index works correctly\n")
+
+
+def test_cached_orderings():
+    """Test cached listing orders stay equal to a fresh sort."""
+    print("=" * 60)
+    print("Testing Cached Orderings")
+    print("=" * 60)
+    
+    engine = SearchEngine()
+    for i in range(1, 21):
+        engine.add_product(Product(i, f"Item {i % 7}", (i * 37) % 50, (i % 5) + 0.5, (i * 13) % 9))
+    
+    def check():
+        for sort_by in ('price', 'rating', 'popularity', 'name', 'id'):
+            for order in ('asc', 'desc'):
+                expected = sort_products(engine.get_all_products(), sort_by=sort_by, order=order)
+                assert engine.sort_products(sort_by=sort_by, order=order) == expected, (sort_by, order)
+    
+    check()
+    version = engine.version
+    engine.add_product(Product(21, "Item new", 12.0, 3.0, 4))
+    engine.add_product(Product(5, "Item renamed", 99.0, 1.0, 0))
+    engine.remove_product(8)
+    assert engine.version == version + 3
+    check()
+    print(f"Cached orderings match merge sort after writes (version {engine.version})")
+    
+    # A product that fails to insert leaves the catalog unchanged
+    for failing, hash_type in ((engine, None), (SearchEngine(hash_type='fibonacci'), 'fibonacci')):
+        failing.sort_products('id')
+        count, version, stats = failing.get_product_count(), failing.version, failing.stats.to_dict()
+        try:
+            failing.add_product(Product("abc", "Item odd", 1.0, 1.0, 1))
+            assert False, "Incomparable product accepted"
+        except TypeError:
+            pass
+        assert failing.get_product_count() == count and failing.version == version
+        assert failing.stats.to_dict() == stats and "abc" not in failing.sequence
+        assert failing.search_by_id("abc") is None and not failing.search_by_name("item odd")
+        assert len(failing.sort_products('id')) == len(failing.sort_products('price')) == count
+    
+    # Names and categories are checked before any index changes
+    failing = SearchEngine(hash_type='fibonacci')
+    failing.add_products([Product(i, f"Item {i}", 1.0 + i, 4.0, i, category="Audio") for i in range(1, 10)])
+    recommender = RecommendationEngine(failing)
+    for bad in (Product(10, None, 1.0, 1.0, 1), Product(10, "Item ten", 1.0, 1.0, 1, category=5),
+                Product(3, None, 1.0, 1.0, 1)):
+        count, version, stats = failing.get_product_count(), failing.version, failing.stats.to_dict()
+        for add in (failing.add_product, lambda product: failing.add_products([product])):
+            try:
+                add(bad)
+                assert False, "Product with a bad name or category accepted"
+            except TypeError:
+                pass
+            assert failing.get_product_count() == failing.hash_table.count == count and failing.version == version
+            assert failing.stats.to_dict() == stats and failing.search_by_id(10) is None
+            assert failing.search_by_id(3).name == "Item 3" and not failing.search_by_name("item ten")
+            assert [p.product_id for p in failing.name_order.items] == sorted(range(1, 10), key=lambda i: f"item {i}")
+    assert len(recommender.get_recommendations(1, 5)) == 5
+    
+    # Multi-key: one pass equals stable passes from the last key to the first
+    expected = sort_products(engine.get_all_products(), sort_by='name', order='desc')
+    expected = sort_products(expected, sort_by='rating', order='desc')
+    spec = [('rating', 'desc'), ('name', 'desc')]
+    assert sort_products(engine.get_all_products(), sort_by=spec) == expected
+    assert engine.sort_products(sort_by='rating:desc,name:desc') == expected
+    assert engine.sort_products(sort_by=spec, algorithm='merge') == expected
+    print("Multi-key sort 'rating:desc,name:desc' matches two stable passes")
+    
+    # Top-k selection equals the head of the full sort
+    everything = engine.get_all_products()
+    for sort_by, order in (('rating', 'desc'), ('name', 'asc'), (spec, 'asc')):
+        head = sort_products(everything, sort_by=sort_by, order=order)[:5]
+        assert top_k_products(everything, 5, sort_by=sort_by, order=order) == head
+    assert engine.sort_products(sort_by='popularity', order='desc', limit=3) == \
+        sort_products(everything, sort_by='popularity', order='desc')[:3]
+    assert top_k_products(everything, 0) == []
+    for algorithm in (None, 'merge'):
+        try:
+            engine.sort_products('price', algorithm=algorithm, limit=-1)
+            assert False, "Negative limit accepted"
+        except ValueError:
+            pass
+    
+    # Repeated keys collapse, and unpinned orderings are bounded by an LRU
+    assert parse_sort_spec('price,price:desc,rating') == [('price', 'asc'), ('rating', 'asc')]
+    engine.sort_products('id')
+    engine.sort_products('price')
+    from itertools import permutations
+    specs = [list(zip(keys, ('desc', 'asc', 'desc')))
+             for keys in permutations(('rating', 'price', 'name', 'popularity', 'id'), 3)]
+    for spec in specs:
+        assert engine.sort_products(spec) == sort_products(engine.get_all_products(), sort_by=spec)
+    assert len(engine.orderings) <= SearchEngine.MAX_CACHED_ORDERINGS + len(SearchEngine.PINNED_ORDERINGS)
+    assert (('id', 'asc'),) in engine.orderings and (('price', 'asc'),) in engine.orderings
+    assert tuple(specs[-1]) in engine.orderings and tuple(specs[0]) not in engine.orderings
+    print(f"{len(specs)} sort specs served from {len(engine.orderings)} cached orderings")
+    print("✓ Cached orderings work correctly\n")
+
+
+def test_keyset_pagination():
+    """Test cursor-based pagination."""
+    print("=" * 60)
+    print("Testing Keyset Pagination")
+    print("=" * 60)
+    
+    engine = SearchEngine()
+    for i in range(1, 26):
+        engine.add_product(Product(i, f"Cable {i % 4}", 10 + i % 6, 4.0, i))
+    
+    def walk(**kwargs):
+        seen, cursor = [], None
+        while True:
+            page, cursor = engine.page_products(page_size=7, cursor=cursor, **kwargs)
+            seen.extend(page)
+            if cursor is None:
+                return seen
+    
+    for spec in ('id', 'price:desc,name:desc'):
+        assert walk(sort_by=spec) == engine.sort_products(sort_by=spec)
+    
+    # Inserting ahead of the cursor does not shift the next page
+    page, cursor = engine.page_products(sort_by='price', page_size=7)
+    expected_next = engine.page_products(sort_by='price', page_size=7, cursor=cursor)[0]
+    engine.add_product(Product(99, "Cable cheap", 1.0, 4.0, 0))
+    assert engine.page_products(sort_by='price', page_size=7, cursor=cursor)[0] == expected_next
+    
+    try:
+        engine.page_products(sort_by='name', cursor=cursor)
+        assert False, "cursor from another sort was accepted"
+    except ValueError as e:
+        print(f"Rejected foreign cursor: {e}")
+    
+    for page_size in (0, -3):
+        for listing in (lambda: engine.page_products(page_size=page_size),
+                        lambda: engine.search_page("cable", page_size=page_size)):
+            try:
+                listing()
+                assert False, "non-positive page size accepted"
+            except ValueError:
+                pass
+    
+    # Forged cursors with the right scope but keys of the wrong type are rejected too
+    import base64, json
+    for key in (["x"], [[1]], [{"desc": "x"}], [None, 1]):
+        data = json.dumps({"s": ["list", ["id", "asc"]], "k": key}).encode()
+        try:
+            engine.page_products(sort_by='id', cursor=base64.urlsafe_b64encode(data).decode())
+            assert False, f"forged cursor {key} was accepted"
+        except ValueError:
+            pass
+    
+    # Search results page through the same way
+    results, cursor = engine.search_page("cable 1", page_size=2)
+    while cursor:
+        page, cursor = engine.search_page("cable 1", page_size=2, cursor=cursor)
+        results.extend(page)
+    assert {p.product_id for p in results} == {p.product_id for p in engine.search_by_name_hash("cable 1")}
+    engine.search_page("cable 1", page_size=2)
+    assert "cable 1" in engine.searches  # Later pages reuse the ranked matches
+    engine.add_product(Product(100, "Cable 1 A", 1.0, 4.0, 0))
+    assert 100 in {p.product_id for p in engine.search_page("cable 1", page_size=100)[0]}
+    print(f"Paged through {len(results)} search results")
+    print("✓ Keyset pagination works correctly\n")
+
+
+def test_catalog_stats():
+    """Test incrementally maintained catalog statistics."""
+    print("=" * 60)
+    print("Testing Catalog Statistics")
+    print("=" * 60)
+    
+    stats = CatalogStats()
+    products = [Product(i, f"Item {i}", (i * 17) % 40 + 0.99, (i % 6) * 0.8, (i * 29) % 11) for i in range(30)]
+    live = []
+    for i, p in enumerate(products):
+        stats.add(p)
+        live.append(p)
+        if i % 3 == 2:
+            # Remove the current extremes to exercise lazy heap deletion
+            extreme = max(live, key=lambda q: q.popularity)
+            stats.remove(extreme)
+            live.remove(extreme)
+        for field in CatalogStats.FIELDS:
+            values = [getattr(q, field) for q in live]
+            assert stats.min(field) == min(values) and stats.max(field) == max(values), field
+    assert stats.count == len(live)
+    assert abs(stats.sum('price') - sum(q.price for q in live)) < 1e-6
+    print(f"Popularity range after churn: {stats.min('popularity')}-{stats.max('popularity')}")
+    
+    engine = SearchEngine()
+    for p in products[:5]:
+        engine.add_product(p)
+    engine.remove_product(products[4].product_id)
+    assert engine.stats.max('popularity') == max(p.popularity for p in products[:4])
+    print("✓ Catalog statistics work correctly\n")
+
+
+def test_recommendation_tokens():
+    """Test per-product keyword token cache."""
+    print("=" * 60)
+    print("Testing Recommendation Token Cache")
+    print("=" * 60)
+    
+    engine = SearchEngine()
+    engine.add_product(Product(1, "Gaming Laptop Pro", 1999.99, 4.8, 2000, category="Laptops"))
+    recommender = RecommendationEngine(engine)  # Tokenizes the existing catalog
+    engine.add_product(Product(2, "Laptop Stand for the Desk", 49.99, 4.4, 500, category="Accessories"))
+    
+    laptop, stand = engine.search_by_id(1), engine.search_by_id(2)
+    assert recommender._jaccard(recommender._product_tokens(laptop), recommender._product_tokens(stand)) == \
+        recommender.name_similarity(laptop.name, stand.name)
+    print(f"Keyword overlap: {recommender.name_similarity(laptop.name, stand.name):.2f}")
+    
+    # Replacing a product re-tokenizes it; removing drops the cache entry
+    engine.add_product(Product(2, "Gaming Laptop Sleeve", 29.99, 4.1, 450, category="Accessories"))
+    sleeve = engine.search_by_id(2)
+    assert recommender._product_tokens(sleeve) == recommender.product_tokens[2][1]
+    assert recommender.name_similarity(laptop.name, sleeve.name) == 0.5
+    engine.remove_product(2)
+    assert 2 not in recommender.product_tokens
+    print("✓ Token cache works correctly\n")
+
+
+def test_vectorized_scoring():
+    """Test vectorized scores are identical to calculate_similarity."""
+    print("=" * 60)
+    print("Testing Vectorized Similarity Scoring")
+    print("=" * 60)
+    
+    engine = SearchEngine()
+    recommender = RecommendationEngine(engine)
+    assert recommender.features is not None, "NumPy is required (see requirements.txt)"
+    
+    words = ["Gaming", "Laptop", "Wireless", "Mouse", "Cable", "USB-C", "Pro", "Stand", "the", "4K"]
+    categories = ["Laptops", "Accessories", "Cables", "Audio", "Furniture", "Wearables"]
+    for i in range(120):
+        name = " ".join(words[(i * k) % len(words)] for k in (1, 3, 7)[:1 + i % 3])
+        engine.add_product(Product(i, name, (i * 53) % 2100 + 0.99, (i % 11) / 2.2, (i * 37) % 900,
+                                   category=categories[i % len(categories)]))
+    for i in range(0, 120, 7):
+        engine.remove_product(i)
+    engine.add_product(Product(3, "Noise Cancelling Headphones", 299.99, 4.9, 5000, category="Audio"))
+    
+    for target in engine.get_all_products()[::9]:
+        scores = recommender.score_all(target)
+        for row, product in enumerate(recommender.features.products):
+            assert scores[row] == recommender.calculate_similarity(target, product), (target, product)
+    print(f"Scores identical for {len(engine.get_all_products())} products after churn")
+    print("✓ Vectorized scoring works correctly\n")
+
+
+CATALOG_CATEGORIES = ["Laptops", "Accessories", "Cables", "Audio", "Storage"]
+
+
+def add_catalog(engine, count, name=lambda i: f"Item {i % 13} Series {i % 5}"):
+    """Add products 0..count-1 with spread prices, ratings, popularity and categories."""
+    for i in range(count):
+        engine.add_product(Product(i, name(i), (i * 71) % 1900 + 5, (i % 9) / 2, (i * 11) % 300,
+                                   category=CATALOG_CATEGORIES[(i // 3) % len(CATALOG_CATEGORIES)]))
+
+
+def assert_diversified_ranking(recommender, engine, limit=12, step=3):
+    """Assert get_recommendations() equals diversifying each product's full ranking."""
+    count = len(engine.get_all_products())
+    for target in engine.get_all_products()[::step]:
+        ranking, _, _ = recommender._top_candidates(target, count)
+        expected, _ = recommender._diversify(ranking, limit)
+        assert recommender.get_recommendations(target.product_id, limit) == expected, target.product_id
+
+
+def test_recommendation_candidates():
+    """Test top-k candidate selection gives the same recommendations as a full ranking."""
+    print("=" * 60)
+    print("Testing Recommendation Candidate Selection")
+    print("=" * 60)
+    
+    engine = SearchEngine()
+    recommender = RecommendationEngine(engine)
+    add_catalog(engine, 400)
+    
+    for product_id in (0, 57, 399):
+        target = engine.search_by_id(product_id)
+        ranked = [(p, recommender.calculate_similarity(target, p))
+                  for p in engine.get_all_products() if p.product_id != product_id]
+        ranked.sort(key=lambda x: x[1], reverse=True)
+        for count in (1, 12, 48, 399, 500):
+            top, total, _ = recommender._top_candidates(target, count)
+            assert top == ranked[:count] and total == 399, (product_id, count)
+    print("Top-k candidates match the full ranking for 400 products")
+    
+    # Recommendations equal diversifying the full ranking, with default and other caps
+    assert_diversified_ranking(recommender, engine, step=7)
+    for caps in ({'max_per_category': 12}, {'max_per_category': 1, 'max_per_tier': 10},
+                 {'max_per_category': 2, 'max_per_tier': 1}):
+        assert_diversified_ranking(RecommendationEngine(engine, **caps), engine, limit=10, step=7)
+    print("Recommendations match diversifying the full ranking")
+    
+    # Caps hold while enough diverse candidates exist, and are configurable
+    recommendations = recommender.get_recommendations(57, 10)
+    categories_seen = [p.category for p in recommendations]
+    assert len(recommendations) == 10
+    assert max(categories_seen.count(c) for c in categories_seen) <= 3
+    strict = RecommendationEngine(engine, max_per_category=1, max_per_tier=10)
+    assert len({p.category for p in strict.get_recommendations(57, 5)}) == 5
+    print("✓ Candidate selection works correctly\n")
+
+
+def test_neighbor_table():
+    """Test the materialized neighbor table stays equal to a fresh ranking."""
+    print("=" * 60)
+    print("Testing Neighbor Table")
+    print("=" * 60)
+    
+    engine = SearchEngine()
+    recommender = RecommendationEngine(engine)
+    engine.add_product(Product(1000, "Popularity Floor", 10.0, 3.0, 0, category="Cables"))
+    engine.add_product(Product(1001, "Popularity Ceiling", 10.0, 3.0, 10000, category="Cables"))
+    add_catalog(engine, 150)
+    assert recommender.build_neighbors() == 152
+    
+    # Adds, removals and replacements inside the popularity range are spliced in
+    for i in range(150, 200):
+        engine.add_product(Product(i, f"Item {i % 7} Series {i % 3}", (i * 37) % 1500 + 5, (i % 7) / 1.5, (i * 13) % 400,
+                                   category=CATALOG_CATEGORIES[i % len(CATALOG_CATEGORIES)]))
+    for i in range(0, 200, 7):
+        engine.remove_product(i)
+    engine.add_product(Product(10, "Item 3 Series 2", 99.0, 4.5, 250, category="Audio"))
+    assert len(recommender.neighbors) > 100
+    
+    def assert_rows_fresh(recommender):
+        # A row is the top of the ranking, then the best few of every (category, tier) group
+        table = recommender.neighbors
+        for product_id in list(table.rows):
+            target = engine.search_by_id(product_id)
+            neighbors, complete = recommender.get_neighbors(target)
+            prefix = table.rows[product_id][3]
+            ranking, total, _ = recommender._top_candidates(target, len(engine.get_all_products()))
+            assert neighbors[:prefix] == ranking[:prefix], product_id
+            assert complete or prefix >= recommender.NEIGHBOR_COUNT
+            for group in {table.group(p) for p, _ in ranking}:
+                listed = [entry for entry in neighbors if table.group(entry[0]) == group]
+                members = [entry for entry in ranking if table.group(entry[0]) == group]
+                assert listed == members[:len(listed)] and len(listed) >= min(table.heads, len(members))
+    
+    assert_rows_fresh(recommender)
+    print(f"{len(recommender.neighbors)} neighbor rows match a fresh ranking after churn")
+    
+    # Rows list enough of every (category, tier) group that diversifying them
+    # picks what the full ranking would, whatever the caps
+    assert_diversified_ranking(recommender, engine)
+    for offset, caps in ((201, {'max_per_category': 12}), (211, {'max_per_category': 1, 'max_per_tier': 10})):
+        capped = RecommendationEngine(engine, **caps)
+        capped.build_neighbors()
+        for i in range(offset, offset + 10):
+            engine.remove_product(i - 200)
+            engine.add_product(Product(i, f"Item {i % 13}", (i * 29) % 1500 + 5, (i % 9) / 2, (i * 7) % 300,
+                                       category=CATALOG_CATEGORIES[i % len(CATALOG_CATEGORIES)]))
+        assert_diversified_ranking(capped, engine)
+        assert_rows_fresh(capped)
+    print("Recommendations from the rows match diversifying the full ranking")
+    
+    # The process-pool builder produces the same rows
+    assert recommender.features is not None, "NumPy is required (see requirements.txt)"
+    recommender.build_neighbors()
+    expected = {pid: recommender.neighbors.get(pid) for pid in recommender.neighbors.rows}
+    assert recommender.build_all(workers=2, block_size=16) == len(engine.get_all_products())
+    assert {pid: recommender.neighbors.get(pid) for pid in recommender.neighbors.rows} == expected
+    print(f"Parallel build matches for {len(expected)} products")
+    
+    # A new popularity extreme changes every score: the rows are dropped and
+    # rebuilt as they are read
+    engine.add_product(Product(2000, "Bestseller", 10.0, 3.0, 20000, category="Cables"))
+    assert len(recommender.neighbors) == 0
+    for product in engine.get_all_products()[::5]:
+        recommender.get_recommendations(product.product_id, 12)
+    assert len(recommender.neighbors) > 30
+    assert_rows_fresh(recommender)
+    
+    # Without planted extremes, ordinary churn keeps moving the range
+    engine = SearchEngine()
+    recommender = RecommendationEngine(engine)
+    add_catalog(engine, 150)
+    recommender.build_neighbors()
+    for i in range(150, 160):
+        engine.add_product(Product(i, f"Item {i % 13} Series {i % 5}", 50.0 + i, 4.0, (i - 140) * 40,
+                                   category=CATALOG_CATEGORIES[i % len(CATALOG_CATEGORIES)]))
+    engine.add_products(Product(i, f"Item {i % 7}", 20.0 + i, 2.5, i % 5, category="Audio") for i in range(160, 163))
+    for i in (159, 158, 0, 1):  # The two most and two least popular
+        engine.remove_product(i)
+        for product in engine.get_all_products()[::3]:
+            recommender.get_neighbors(product)
+    assert recommender.neighbor_range == (0, 680)
+    assert len(recommender.neighbors) > 40
+    assert_rows_fresh(recommender)
+    print(f"{len(recommender.neighbors)} rows rebuilt across popularity range changes")
+    
+    # Replacing the product holding the popularity maximum lists it once,
+    # on the per-pair path as well
+    for vectorized in (True, False):
+        engine = SearchEngine()
+        recommender = RecommendationEngine(engine)
+        if not vectorized:
+            recommender.features = None
+        for i in range(6):
+            engine.add_product(Product(i, f"Laptop {i}", 500.0 + i, 4.0, i * 10, category="Laptops"))
+        recommender.build_neighbors()
+        engine.add_product(Product(5, "Laptop 5", 505.0, 4.0, 999, category="Laptops"))
+        assert [p.product_id for p in recommender.get_recommendations(0, 10)] == [1, 2, 3, 4, 5]
+        assert_rows_fresh(recommender)
+    print("✓ Neighbor table works correctly\n")
+
+
+def test_approximate_candidates():
+    """Test MinHash LSH candidate generation against the exact ranking."""
+    print("=" * 60)
+    print("Testing Approximate Candidates")
+    print("=" * 60)
+    
+    lsh = MinHashLSH()
+    lsh.add(1, 'g', {1, 2, 3})
+    lsh.add(2, 'g', {1, 2, 3})
+    lsh.add(3, 'g', {7, 8, 9})
+    lsh.add(4, 'h', {1, 2, 3})
+    assert lsh.query(['g'], {1, 2, 3})[:2] == [1, 2] and 3 not in lsh.query(['g'], {1, 2, 3})
+    assert 4 in lsh.query(['g', 'h'], {1, 2, 3})
+    lsh.remove(2)
+    assert lsh.query(['g'], {1, 2, 3}) == [1]
+    
+    engine = SearchEngine()
+    recommender = RecommendationEngine(engine)
+    words = ["Pro", "Ultra", "Wireless", "Gaming", "Compact", "Studio", "Travel", "Smart"]
+    add_catalog(engine, 600, name=lambda i: " ".join(words[(i * k) % len(words)] for k in (1, 3, 5)[:1 + i % 3])
+                + f" Model{i % 17}")
+    for i in range(0, 600, 10):
+        engine.remove_product(i)
+    assert recommender.lsh is None  # Built by the first approximate query
+    
+    found = 0
+    targets = engine.get_all_products()[::37]
+    for target in targets:
+        product_id = target.product_id
+        candidates = recommender.approximate_candidates(target, 100)
+        assert len(candidates) <= 100 and product_id not in {p.product_id for p, _ in candidates}
+        assert candidates == sorted(candidates, key=lambda x: -x[1])
+        assert all(similarity == recommender.calculate_similarity(target, p) for p, similarity in candidates)
+        exact, _, _ = recommender._top_candidates(target, 12)
+        found += len({p.product_id for p, _ in exact} & {p.product_id for p, _ in candidates[:12]})
+    recall = found / (12 * len(targets))
+    assert recall >= 0.9, recall
+    print(f"Recall@12 with 100 of 540 candidates: {recall:.2f}")
+    
+    assert len(recommender.get_recommendations(57, 10, approximate=True)) == 10
+    
+    # Once built, the approximate index follows catalog changes
+    engine.remove_product(58)
+    target = engine.search_by_id(57)
+    engine.add_product(Product(5000, target.name, target.price, 0.0, 0, category=target.category))
+    candidate_ids = [p.product_id for p, _ in recommender.approximate_candidates(target, 100)]
+    assert 5000 in candidate_ids and 58 not in candidate_ids
+    print("✓ Approximate candidates work correctly\n")
+
+
+def test_category_index():
+    """Test the category and price indexes match a filtered, rating-sorted scan."""
+    print("=" * 60)
+    print("Testing Category Index")
+    print("=" * 60)
+    
+    engine = SearchEngine()
+    recommender = RecommendationEngine(engine)
+    categories = ["Laptops", "laptops", "Audio", "Cables"]
+    for i in range(200):
+        engine.add_product(Product(i, f"Item {i}", 10.0 + i, (i * 7 % 11) / 2.2, i,
+                                   category=categories[i % len(categories)]))
+    for i in range(0, 200, 9):
+        engine.remove_product(i)
+    engine.add_product(Product(5, "Item 5 v2", 15.0, 4.9, 5, category="Audio"))  # Re-rated, new category
+    
+    for category in ("LAPTOPS", "audio", "Cables", "Unknown"):
+        expected = [p for p in engine.get_all_products() if p.category.lower() == category.lower()]
+        expected.sort(key=lambda p: p.rating, reverse=True)
+        for limit in (1, 5, 1000):
+            assert recommender.get_recommendations_by_category(category, limit) == expected[:limit], category
+    print(f"Top Laptops: {[p.name for p in recommender.get_recommendations_by_category('laptops', 3)]}")
+    
+    # Price ranges come from the price ordering, best rated first
+    for price, tolerance in ((50.0, 0.3), (120.0, 0.1), (5.0, 0.5), (150.0, 0.0)):
+        expected = [p for p in engine.get_all_products()
+                    if price * (1 - tolerance) <= p.price <= price * (1 + tolerance)]
+        expected.sort(key=lambda p: p.rating, reverse=True)
+        for limit in (1, 5, 1000):
+            assert recommender.get_similar_price_range(price, tolerance, limit) == expected[:limit], (price, tolerance)
+    in_range = engine.search_by_price_range(20.0, 30.0)
+    assert [p.price for p in in_range] == sorted(p.price for p in engine.get_all_products() if 20.0 <= p.price <= 30.0)
+    print("✓ Category index works correctly\n")
+
+
 def main():
     """Run all tests."""
     print("\n" + "=" * 60)
@@ -165,9 +1001,23 @@ def main():
     try:
         test_product()
         test_hash_table()
+        test_hash_table_churn()
+        test_hash_table_stats()
+        test_bulk_load()
+        test_frozen_catalog()
         test_binary_search()
         test_sorting()
         test_search_engine()
+        test_ngram_index()
+        test_cached_orderings()
+        test_keyset_pagination()
+        test_catalog_stats()
+        test_recommendation_tokens()
+        test_vectorized_scoring()
+        test_recommendation_candidates()
+        test_neighbor_table()
+        test_approximate_candidates()
+        test_category_index()
         
         print("=" * 60)
         print("ALL TESTS PASSED! ✓")